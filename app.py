@@ -1,21 +1,51 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Flask, render_template, request, jsonify, redirect, url_for, g
 from library_system import LibrarySystem
+from storage import default_storage
+from metrics import render as render_metrics
+from functools import wraps
+import atexit
 import os
+import time
+import zlib
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
 
 # Initialize library system
-lib = LibrarySystem()
+# Storage backend: CSV + journal by default, SQLite when LIBRARY_DB is set
+lib = LibrarySystem(default_storage())
+# Flush the journal's last records on shutdown
+atexit.register(lib.close)
 
 # Load initial data
 try:
-    lib.load_books_from_csv("books.csv")
-    lib.load_members_from_csv("members.csv")
-    print("✓ Books and members loaded successfully")
+    stats = lib.load()
+    print(f"✓ Books and members loaded successfully "
+          f"({stats['books']} books from {stats['source']} in {stats['seconds'] * 1000:.1f} ms)")
 except Exception as e:
     print(f"Error loading data: {e}")
 
+# ==================== METRICS ====================
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Route template, not the raw path, keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        lib.metrics.observe_request(request.method, route, response.status_code,
+                                    time.perf_counter() - start)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def api_metrics():
+    return app.response_class(render_metrics(lib.metrics, lib),
+                              mimetype='text/plain; version=0.0.4')
+
 # ==================== ROUTES ====================
 
 @app.route('/')
@@ -40,22 +70,77 @@ def admin():
 
 # ==================== API ENDPOINTS ====================
 
+MAX_PAGE_SIZE = 500
+
+# Serialized listing responses, keyed by URL and valid for one lib.version
+response_cache = {}
+# Versions restart at every launch, so ETags carry a per-process prefix
+ETAG_PREFIX = os.urandom(4).hex()
+
+def cached_by_version(view):
+    """
+    For GET views returning JSON-able data: serve a 304 when the client's
+    If-None-Match matches the current library version, otherwise reuse the
+    body serialized for this URL at this version.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = lib.version
+        etag = f"{ETAG_PREFIX}-v{version}"
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+
+        key = request.full_path
+        entry = response_cache.get(key)
+        if entry is None or entry[0] != version:
+            if entry is not None or len(response_cache) > 256:
+                # Data changed: every cached body is stale
+                response_cache.clear()
+            entry = (version, app.json.dumps(view(*args, **kwargs)))
+            response_cache[key] = entry
+
+        response = app.response_class(entry[1], mimetype='application/json')
+        response.set_etag(f"{ETAG_PREFIX}-v{entry[0]}")
+        return response
+    return wrapper
+
+def book_json(isbn, data):
+    return {
+        'isbn': isbn,
+        'title': data['title'],
+        'author': data['author'],
+        'year': data['year'],
+        'category': data['category'],
+        'available_copies': data['available_copies']
+    }
+
 @app.route('/api/books/all', methods=['GET'])
+@cached_by_version
 def api_get_all_books():
-    books_list = lib.list_all_books()
-    books_data = []
-    
-    for isbn, data in books_list:
-        books_data.append({
-            'isbn': isbn,
-            'title': data['title'],
-            'author': data['author'],
-            'year': data['year'],
-            'category': data['category'],
-            'available_copies': data['available_copies']
-        })
-    
-    return jsonify(books_data)
+    # ?offset=&limit= or ?after=<isbn>&limit= → one page walked from the tree
+    # One snapshot per request: offset, page and total describe the same
+    # version even while borrows/adds land concurrently
+    books = lib.snapshot()
+    if any(arg in request.args for arg in ('offset', 'limit', 'after')):
+        limit = min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+        after = request.args.get('after')
+        if after is not None:
+            offset = books.rank(after) + (1 if books.search(after) else 0)
+            page = books.page_after(after, max(limit, 0))
+        else:
+            offset = request.args.get('offset', 0, type=int)
+            page = books.page(max(offset, 0), max(limit, 0))
+        return {
+            'books': [book_json(isbn, data) for isbn, data in page],
+            'total': books.size,
+            'offset': offset,
+            'limit': limit,
+            'next_after': page[-1][0] if page and len(page) == limit else None
+        }
+
+    return [book_json(isbn, data) for isbn, data in books.iter_inorder()]
 
 @app.route('/api/books/search', methods=['POST'])
 def api_search_books():
@@ -67,53 +152,62 @@ def api_search_books():
     
     try:
         if search_type == 'isbn':
-            node = lib.books.search(query)
-            if node:
-                results = [{
-                    'isbn': query,
-                    'title': node.value['title'],
-                    'author': node.value['author'],
-                    'year': node.value['year'],
-                    'category': node.value['category'],
-                    'available_copies': node.value['available_copies']
-                }]
-        
+            found = lib.find_by_isbn(query)
         elif search_type == 'title':
-            isbn = lib.title_index.get_isbn(query)
-            if isbn:
-                node = lib.books.search(isbn)
-                if node:
-                    results = [{
-                        'isbn': isbn,
-                        'title': node.value['title'],
-                        'author': node.value['author'],
-                        'year': node.value['year'],
-                        'category': node.value['category'],
-                        'available_copies': node.value['available_copies']
-                    }]
-        
+            found = lib.find_by_title(query)
         elif search_type == 'author':
-            books = lib.search_by_author(query)
-            for book in books:
-                all_books = lib.list_all_books()
-                for isbn, data in all_books:
-                    if (data['title'] == book['title'] and 
-                        data['author'] == book['author']):
-                        results.append({
-                            'isbn': isbn,
-                            'title': data['title'],
-                            'author': data['author'],
-                            'year': data['year'],
-                            'category': data['category'],
-                            'available_copies': data['available_copies']
-                        })
-                        break
+            found = lib.find_by_author(query)
+        elif search_type == 'keyword':
+            found = lib.search_text(query, int(data.get('limit', 20)))
+        elif search_type == 'fuzzy':
+            found = lib.search_fuzzy(query, int(data.get('limit', 20)))
+        else:
+            found = []
+        results = [book_json(isbn, book) for isbn, book in found]
     except Exception as e:
         print(f"Search error: {e}")
         return jsonify([])
     
     return jsonify(results)
 
+@app.route('/api/books/autocomplete', methods=['GET'])
+def api_autocomplete_books():
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify([book_json(isbn, data) for isbn, data in lib.autocomplete_titles(query, limit)])
+
+@app.route('/api/books/filter', methods=['GET'])
+def api_filter_books():
+    found = lib.filter_books(
+        category=request.args.get('category'),
+        year_from=request.args.get('year_from', type=int),
+        year_to=request.args.get('year_to', type=int),
+        available_only=request.args.get('available') in ('1', 'true'),
+        limit=min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+    )
+    return jsonify([book_json(isbn, data) for isbn, data in found])
+
+@app.route('/api/books/categories', methods=['GET'])
+def api_book_categories():
+    return jsonify([{'category': name, 'count': count}
+                    for name, count in lib.list_categories()])
+
+@app.route('/api/books/<isbn>/holders', methods=['GET'])
+def api_book_holders(isbn):
+    node = lib.books.search(isbn)
+    if not node:
+        return jsonify({'success': False, 'message': 'Book not found'}), 404
+
+    holders = [{'member_id': member_id, 'name': member.name, 'copies': copies}
+               for member_id, member, copies in lib.book_holders(isbn)]
+    return jsonify({
+        'isbn': isbn,
+        'title': node.value['title'],
+        'available_copies': node.value['available_copies'],
+        'on_loan': sum(h['copies'] for h in holders),
+        'holders': holders
+    })
+
 @app.route('/api/books/borrow', methods=['POST'])
 def api_borrow_book():
     data = request.json
@@ -126,16 +220,10 @@ def api_borrow_book():
     success = lib.borrow_book(member_id, isbn)
     
     if success:
-        lib.save_books()
-        lib.save_members()
+        lib.persist()
         return jsonify({'success': True, 'message': 'Book borrowed successfully'})
     else:
-        member = lib.members.get_member(member_id)
-        if not member:
-            return jsonify({'success': False, 'message': 'Member not found'})
-        if not member.can_borrow():
-            return jsonify({'success': False, 'message': 'Borrow limit reached (max 5 books)'})
-        return jsonify({'success': False, 'message': 'Book not available'})
+        return jsonify({'success': False, 'message': lib.borrow_refusal(member_id, isbn)})
 
 @app.route('/api/books/return', methods=['POST'])
 def api_return_book():
@@ -149,11 +237,10 @@ def api_return_book():
     success = lib.return_book(member_id, isbn)
     
     if success:
-        lib.save_books()
-        lib.save_members()
+        lib.persist()
         return jsonify({'success': True, 'message': 'Book returned successfully'})
     else:
-        return jsonify({'success': False, 'message': 'Return failed'})
+        return jsonify({'success': False, 'message': lib.return_refusal(member_id, isbn)})
 
 @app.route('/api/books/add', methods=['POST'])
 def api_add_book():
@@ -173,6 +260,18 @@ def api_add_book():
     else:
         return jsonify({'success': False, 'message': 'Book already exists'})
 
+@app.route('/api/books/remove', methods=['POST'])
+def api_remove_book():
+    isbn = (request.get_json(silent=True) or {}).get('isbn')
+    if not isinstance(isbn, str) or not isbn:
+        return jsonify({'success': False, 'message': 'ISBN required'}), 400
+    
+    if lib.remove_book(isbn):
+        return jsonify({'success': True, 'message': 'Book removed successfully'})
+    if not lib.search_by_isbn(isbn):
+        return jsonify({'success': False, 'message': 'Book not found'})
+    return jsonify({'success': False, 'message': 'Book is on loan; it can be removed once all copies are returned'})
+
 @app.route('/api/members/add', methods=['POST'])
 def api_add_member():
     data = request.json
@@ -180,51 +279,61 @@ def api_add_member():
     success = lib.add_member(data['member_id'], data['name'])
     
     if success:
-        lib.save_members()
+        lib.persist()
         return jsonify({'success': True, 'message': 'Member added successfully'})
     else:
         return jsonify({'success': False, 'message': 'Member already exists'})
 
 @app.route('/api/members/all', methods=['GET'])
+@cached_by_version
 def api_get_all_members():
+    paged = any(arg in request.args for arg in ('offset', 'limit', 'after'))
+    if paged:
+        limit = min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE)
+        after = request.args.get('after')
+        if after is not None:
+            page = lib.list_members_after(after, limit)
+            offset = None
+        else:
+            offset = request.args.get('offset', 0, type=int)
+            page = lib.list_members_page(offset, limit)
+    else:
+        page = lib.list_members()
+
     members_data = []
-    
-    for member_id, member in lib.members.table_items():
-        borrowed_books_details = []
-        for isbn in member.borrowed_books:
-            book_node = lib.books.search(isbn)
-            if book_node:
-                borrowed_books_details.append({
-                    'isbn': isbn,
-                    'title': book_node.value['title']
-                })
-        
+    for member_id, member, books in lib.borrowed_details(page):
         members_data.append({
             'member_id': member_id,
             'name': member.name,
             'borrowed_count': len(member.borrowed_books),
-            'borrowed_books': borrowed_books_details
+            'borrowed_books': [{'isbn': isbn, 'title': data['title']}
+                               for isbn, data in books]
         })
-    
-    return jsonify(members_data)
+
+    if not paged:
+        return members_data
+    return {
+        'members': members_data,
+        'total': lib.count_members(),
+        'offset': offset,
+        'limit': limit,
+        'next_after': members_data[-1]['member_id'] if members_data and len(members_data) == limit else None
+    }
 
 @app.route('/api/members/<member_id>', methods=['GET'])
 def api_get_member(member_id):
-    member = lib.members.get_member(member_id)
+    member = lib.get_member(member_id)
     
     if not member:
         return jsonify({'success': False, 'message': 'Member not found'}), 404
     
-    borrowed_books_details = []
-    for isbn in member.borrowed_books:
-        book_node = lib.books.search(isbn)
-        if book_node:
-            borrowed_books_details.append({
-                'isbn': isbn,
-                'title': book_node.value['title'],
-                'author': book_node.value['author'],
-                'category': book_node.value['category']
-            })
+    (_, _, books), = lib.borrowed_details([(member_id, member)])
+    borrowed_books_details = [{
+        'isbn': isbn,
+        'title': data['title'],
+        'author': data['author'],
+        'category': data['category']
+    } for isbn, data in books]
     
     return jsonify({
         'member_id': member_id,
@@ -234,5 +343,119 @@ def api_get_member(member_id):
         'can_borrow': member.can_borrow()
     })
 
+# ==================== BATCH TRANSACTIONS ====================
+
+# The whole batch holds the writer lock, so its size is capped
+MAX_BATCH = 1000
+
+@app.route('/api/transactions/batch', methods=['POST'])
+def api_transactions_batch():
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'success': False, 'message': 'operations must be a non-empty list'}), 400
+    if len(operations) > MAX_BATCH:
+        return jsonify({'success': False,
+                        'message': f'At most {MAX_BATCH} operations per batch'}), 400
+
+    outcome = lib.apply_batch(operations, atomic=bool(data.get('atomic')))
+    return jsonify({'success': outcome['failed'] == 0, **outcome})
+
+# ==================== CHANGE FEED ====================
+# Clients keep a cursor (epoch + sequence number) and fetch only what
+# changed since; resync = true means the history is gone, refetch all
+
+SSE_KEEPALIVE = 15  # seconds between comments on an idle stream
+
+def parse_cursor(args, headers):
+    """(epoch, seq) from Last-Event-ID "<epoch>-<seq>" or ?since=&epoch=."""
+    last_id = headers.get('Last-Event-ID', '')
+    epoch, _, seq = last_id.rpartition('-')
+    if epoch and seq.isdigit():
+        return epoch, int(seq)
+    return args.get('epoch'), args.get('since', type=int)
+
+@app.route('/api/changes', methods=['GET'])
+def api_changes():
+    epoch, since = parse_cursor(request.args, {})
+    changes, seq = lib.changes.since(since, epoch) if since is not None else (None, lib.changes.seq)
+    return jsonify({
+        'epoch': lib.changes.epoch,
+        'seq': seq,
+        'resync': changes is None,
+        'changes': changes or []
+    })
+
+def sse(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {app.json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+@app.route('/api/changes/stream', methods=['GET'])
+def api_changes_stream():
+    """
+    Server-Sent Events: one "change" event per change, "resync" when the
+    client must refetch (first connect, or fell behind the buffer). The
+    browser's automatic reconnect resumes from Last-Event-ID.
+    """
+    epoch, since = parse_cursor(request.args, request.headers)
+    feed = lib.changes
+
+    def events():
+        seq = since
+        if seq is None or feed.since(seq, epoch)[0] is None:
+            seq = feed.seq
+            yield sse('resync', {'epoch': feed.epoch, 'seq': seq}, f"{feed.epoch}-{seq}")
+        while True:
+            changes, latest = feed.wait(seq, feed.epoch, SSE_KEEPALIVE)
+            if changes is None:
+                seq = latest
+                yield sse('resync', {'epoch': feed.epoch, 'seq': seq}, f"{feed.epoch}-{seq}")
+            elif changes:
+                for change in changes:
+                    yield sse('change', change, f"{feed.epoch}-{change['seq']}")
+                seq = latest
+            else:
+                yield ": keepalive\n\n"
+
+    response = app.response_class(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let proxies pass events through
+    return response
+
+# ==================== EXPORT ====================
+# Streamed straight from the tree in batches: constant memory, and the
+# first bytes go out before the rest of the catalog is even read
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def csv_download(chunks, filename, gzipped=False):
+    if gzipped:
+        chunks = gzip_stream(chunks)
+        filename += '.gz'
+    response = app.response_class(chunks, mimetype='application/gzip' if gzipped else 'text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+@app.route('/api/export/books.csv', methods=['GET'])
+def api_export_books():
+    return csv_download(lib.export_books_csv(), 'books.csv')
+
+@app.route('/api/export/books.csv.gz', methods=['GET'])
+def api_export_books_gz():
+    return csv_download(lib.export_books_csv(), 'books.csv', gzipped=True)
+
+@app.route('/api/export/members.csv', methods=['GET'])
+def api_export_members():
+    return csv_download(lib.export_members_csv(), 'members.csv')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -4,24 +4,108 @@
 # Leaf height = 0
 # =========================
 
+from bisect import bisect_left
+import sys
+
+# Shared copies of repeated field values: a catalog has far fewer
+# authors, categories and years than books
+_years = {}
+
+class BookRecord:
+    """
+    A book's fields in slots instead of a per-book dict. Still read like
+    the original dict: record['title'], record.get(...). Records are
+    shared with snapshots of the tree, so they are never changed in
+    place: update through replace() and AVLTree.update().
+    """
+    FIELDS = ('title', 'author', 'year', 'category', 'available_copies')
+    __slots__ = FIELDS
+
+    def __init__(self, title, author, year, category, available_copies):
+        self.title = title
+        self.author = sys.intern(author)
+        self.year = _years.setdefault(year, year)
+        self.category = sys.intern(category)
+        self.available_copies = available_copies
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        raise TypeError(f"BookRecord is read-only; use "
+                        f"tree.update(isbn, record.replace({key}=...))")
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __contains__(self, key):
+        return key in self.FIELDS
+
+    def __eq__(self, other):
+        return dict(self) == dict(other)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def replace(self, **changes):
+        """A copy with some fields changed (for copy-on-write updates)."""
+        fields = {name: getattr(self, name) for name in self.FIELDS}
+        fields.update(changes)
+        return BookRecord(**fields)
+
+    @classmethod
+    def from_mapping(cls, data):
+        return cls(data['title'], data['author'], data['year'],
+                   data['category'], data['available_copies'])
+
 class Booknode:
-    def __init__(self, ISBN, title, author, year, category, copies):
+    __slots__ = ('key', 'value', 'left', 'right', 'height', 'size')
+
+    def __init__(self, ISBN, value):
         self.key = ISBN
-        self.value = {
-            'title': title,
-            'author': author,
-            'year': year,
-            'category': category,       
-            'available_copies': copies
-        }
+        # Loaders hand over BookRecords; plain dicts are converted
+        self.value = value if type(value) is BookRecord else BookRecord.from_mapping(value)
         self.left = None
         self.right = None
-        self.height = -1  # Empty node height = -1
+        self.height = 0   # Leaf height = 0 (empty subtree = -1)
+        self.size = 1     # Nodes in this subtree (order statistics)
+
+    def copy(self):
+        node = Booknode.__new__(Booknode)
+        node.key = self.key
+        node.value = self.value
+        node.left = self.left
+        node.right = self.right
+        node.height = self.height
+        node.size = self.size
+        return node
 
 class AVLTree:
-    def __init__(self):
+    """
+    persistent=True switches to path copying: a change copies the nodes
+    on its root path (and any it rotates) and publishes a new root, so a
+    published node is never modified again. snapshot() is then O(1) and
+    can be walked without locks while writers carry on; versions nobody
+    holds are reclaimed by the garbage collector.
+    """
+    def __init__(self, persistent=False):
         self.root = None
         self.size = 0
+        self.persistent = persistent
+        # Rebalancing work since creation (exported as metrics)
+        self.right_rotations = 0
+        self.left_rotations = 0
 
     def height(self, node):
         return node.height if node else -1
@@ -32,87 +116,299 @@ class AVLTree:
     def update_height(self, node):
         node.height = 1 + max(self.height(node.left), self.height(node.right))
 
-    # Rotations
+    def subtree_size(self, node):
+        return node.size if node else 0
+
+    def update_size(self, node):
+        node.size = 1 + self.subtree_size(node.left) + self.subtree_size(node.right)
+
+    # A node this change may modify: itself, or a private copy when persistent
+    def _copy(self, node):
+        return node.copy() if self.persistent else node
+
+    # Rotations (the node passed in must already be private; the child
+    # lifted above it is copied here)
     def right_rotate(self, y):
-        x = y.left
+        self.right_rotations += 1
+        x = self._copy(y.left)
         B = x.right
         x.right = y
         y.left = B
         self.update_height(y)
         self.update_height(x)
+        self.update_size(y)
+        self.update_size(x)
         return x
 
     def left_rotate(self, x):
-        y = x.right
+        self.left_rotations += 1
+        y = self._copy(x.right)
         B = y.left
         y.left = x
         x.right = B
         self.update_height(x)
         self.update_height(y)
+        self.update_size(x)
+        self.update_size(y)
         return y
 
-    # Insert
-    def insert(self, ISBN, value):
-        self.root = self._insert(self.root, ISBN, value)
-
-    def _insert(self, node, ISBN, value):
-        if not node:
-            self.size += 1
-            return Booknode(
-                ISBN,
-                value['title'],
-                value['author'],
-                value['year'],
-                value['category'],
-                value['available_copies']
-            )
-
-        if ISBN < node.key:
-            node.left = self._insert(node.left, ISBN, value)
-        elif ISBN > node.key:
-            node.right = self._insert(node.right, ISBN, value)
-        else:
-            return node  # No duplicates
-
+    # Rebalance one node after a change below it (insert or delete)
+    def _rebalance(self, node):
         self.update_height(node)
+        self.update_size(node)
         balance = self.balance_factor(node)
-
-        # LL
-        if balance > 1 and ISBN < node.left.key:
-            return self.right_rotate(node)
-        # RR
-        if balance < -1 and ISBN > node.right.key:
-            return self.left_rotate(node)
-        # LR
-        if balance > 1 and ISBN > node.left.key:
-            node.left = self.left_rotate(node.left)
+        if balance > 1:
+            # LR → LL
+            if self.balance_factor(node.left) < 0:
+                node.left = self.left_rotate(self._copy(node.left))
             return self.right_rotate(node)
-        # RL
-        if balance < -1 and ISBN < node.right.key:
-            node.right = self.right_rotate(node.right)
+        if balance < -1:
+            # RL → RR
+            if self.balance_factor(node.right) > 0:
+                node.right = self.right_rotate(self._copy(node.right))
             return self.left_rotate(node)
+        return node
+
+    # Walk back up a recorded path of (private node, went_left) pairs,
+    # linking the new subtree in and rebalancing every ancestor (sizes
+    # change all the way to the root, so there is no early exit). The
+    # root is published last, in one assignment.
+    def _retrace(self, path, subtree):
+        for parent, went_left in reversed(path):
+            if went_left:
+                parent.left = subtree
+            else:
+                parent.right = subtree
+            subtree = self._rebalance(parent)
+        self.root = subtree
+
+    # Insert (iterative: no Python frame per level)
+    def insert(self, ISBN, value):
+        path = []
+        node = self.root
+        while node:
+            if ISBN == node.key:
+                return  # No duplicates
+            went_left = ISBN < node.key
+            path.append((self._copy(node), went_left))
+            node = node.left if went_left else node.right
+        self._retrace(path, Booknode(ISBN, value))
+        self.size += 1
+
+    # Replace the value stored under ISBN. Returns True if found.
+    def update(self, ISBN, value):
+        if not self.persistent:
+            node = self.search(ISBN)
+            if node:
+                node.value = value
+            return node is not None
+        path = []
+        node = self.root
+        while node and node.key != ISBN:
+            went_left = ISBN < node.key
+            path.append((node.copy(), went_left))
+            node = node.left if went_left else node.right
+        if node is None:
+            return False
+        node = node.copy()
+        node.value = value
+        # Shape unchanged: relink the copied path, nothing to rebalance
+        for parent, went_left in reversed(path):
+            if went_left:
+                parent.left = node
+            else:
+                parent.right = node
+            node = parent
+        self.root = node
+        return True
+
+    # Delete, O(log n). A node with two children is replaced by its
+    # in-order successor node (moved, not its fields copied over), so node
+    # references held elsewhere stay attached to their own book.
+    # Returns True if found.
+    def delete(self, ISBN):
+        path = []
+        node = self.root
+        while node and node.key != ISBN:
+            went_left = ISBN < node.key
+            path.append((self._copy(node), went_left))
+            node = node.left if went_left else node.right
+        if node is None:
+            return False
+
+        if node.left and node.right:
+            # _retrace relinks the successor's old ancestors (below) as
+            # its right subtree
+            below = []
+            successor = node.right
+            while successor.left:
+                below.append((self._copy(successor), True))
+                successor = successor.left
+            successor = self._copy(successor)
+            replacement = successor.right
+            successor.left = node.left
+            path.append((successor, False))
+            path.extend(below)
+        else:
+            replacement = node.left or node.right
+        self._retrace(path, replacement)
+        self.size -= 1
+        return True
+
+    # O(1) read-only view of the current version (persistent mode): an
+    # independent tree sharing every node. A mutable tree returns itself.
+    def snapshot(self):
+        if not self.persistent:
+            return self
+        root = self.root
+        view = AVLTree(persistent=True)
+        view.root = root
+        view.size = root.size if root else 0
+        return view
 
+    # Bulk build from (ISBN, value) pairs already sorted by ISBN
+    # Middle element becomes the root → perfectly balanced, O(n)
+    def build_sorted(self, items):
+        self.root = self._build_sorted(items, 0, len(items) - 1)
+        self.size = len(items)
+
+    def _build_sorted(self, items, lo, hi):
+        if lo > hi:
+            return None
+        mid = (lo + hi) // 2
+        ISBN, value = items[mid]
+        node = Booknode(ISBN, value)
+        node.left = self._build_sorted(items, lo, mid - 1)
+        node.right = self._build_sorted(items, mid + 1, hi)
+        self.update_height(node)
+        self.update_size(node)
         return node
 
     # Search
     def search(self, ISBN):
-        return self._search(self.root, ISBN)
+        node = self.root
+        while node:
+            key = node.key
+            if ISBN == key:
+                return node
+            node = node.left if ISBN < key else node.right
+        return None
 
-    def _search(self, node, ISBN):
-        if not node or node.key == ISBN:
-            return node
-        if ISBN < node.key:
-            return self._search(node.left, ISBN)
-        return self._search(node.right, ISBN)
+    # Multi-get: one traversal for many keys
+    # Sorted keys are split at each node, so shared path prefixes are
+    # walked once instead of once per key
+    def search_many(self, ISBNs):
+        keys = sorted(set(ISBNs))
+        found = {}
+        stack = [(self.root, 0, len(keys))]
+        while stack:
+            node, lo, hi = stack.pop()
+            if not node or lo >= hi:
+                continue
+            mid = bisect_left(keys, node.key, lo, hi)
+            end = mid
+            if mid < hi and keys[mid] == node.key:
+                found[node.key] = node
+                end = mid + 1
+            stack.append((node.left, lo, mid))
+            stack.append((node.right, end, hi))
+        return found
 
     # Inorder
     def inorder(self):
-        result = []
-        self._inorder(self.root, result)
-        return result
+        return list(self.iter_inorder())
+
+    def iter_inorder(self, after=None):
+        """
+        Yield (ISBN, value) in key order, starting after the key `after`
+        if given. Iterative with an explicit stack of pending ancestors,
+        so memory is O(height) and the first item comes after O(log n).
+        """
+        stack = []
+        node = self.root
+        while node:
+            if after is None or after < node.key:
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        while stack:
+            node = stack.pop()
+            yield node.key, node.value
+            node = node.right
+            while node:
+                stack.append(node)
+                node = node.left
+
+    # =========================
+    # Order statistics (subtree sizes)
+    # =========================
 
-    def _inorder(self, node, result):
-        if node:
-            self._inorder(node.left, result)
+    # k-th smallest node (0-based), O(log n)
+    def select(self, k):
+        node = self.root
+        while node:
+            left = self.subtree_size(node.left)
+            if k < left:
+                node = node.left
+            elif k == left:
+                return node
+            else:
+                k -= left + 1
+                node = node.right
+        return None
+
+    # Number of keys strictly smaller than ISBN, O(log n)
+    def rank(self, ISBN):
+        node = self.root
+        r = 0
+        while node:
+            if ISBN <= node.key:
+                node = node.left
+            else:
+                r += self.subtree_size(node.left) + 1
+                node = node.right
+        return r
+
+    # =========================
+    # Windowed in-order walks
+    # The stack holds the pending ancestors, so only the requested
+    # window is visited: O(log n + limit)
+    # =========================
+    def page(self, offset, limit):
+        stack = []
+        node = self.root
+        while node:
+            left = self.subtree_size(node.left)
+            if offset < left:
+                stack.append(node)
+                node = node.left
+            elif offset == left:
+                stack.append(node)
+                break
+            else:
+                offset -= left + 1
+                node = node.right
+        return self._walk(stack, limit)
+
+    def page_after(self, ISBN, limit):
+        stack = []
+        node = self.root
+        while node:
+            if ISBN < node.key:
+                stack.append(node)
+                node = node.left
+            else:
+                node = node.right
+        return self._walk(stack, limit)
+
+    def _walk(self, stack, limit):
+        result = []
+        while stack and len(result) < limit:
+            node = stack.pop()
             result.append((node.key, node.value))
-            self._inorder(node.right, result)
+            child = node.right
+            while child:
+                stack.append(child)
+                child = child.left
+        return result
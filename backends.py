@@ -0,0 +1,205 @@
+# =========================
+# Storage backend check
+#
+#   python backends.py [--books 2000] [--members 200] [--ops 3000] [--seed 1]
+#
+# Seeds every backend from the same books.csv/members.csv, then runs one
+# random sequence of borrows, returns, added and removed books, new
+# members, refused operations and batches (some rolled back) against all
+# of them: CSV files with a journal, SQLite, and SQLite with cache=False
+# (lookups served by the database). Every result must match an in-memory
+# reference library, and so must ISBN, title, author, keyword, faceted,
+# member and loan lookups, both at the end and after reopening the files.
+# Runs on temporary data directories; exits 1 on any mismatch.
+# =========================
+
+from library_system import LibrarySystem, write_csv, BOOK_COLUMNS, MEMBER_COLUMNS
+from storage import StorageBackend, CsvStorage, SQLiteStorage
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+WORDS = ["river", "night", "garden", "café", "stone", "winter", "signal", "harbor",
+         "Ångström", "glass", "orchard", "north"]
+AUTHORS = ["Ada Byrne", "Lin Okafor", "José Martín", "Mira Sato", "Tom Reyes"]
+CATEGORIES = ["Fiction", "Science", "History", "Poetry"]
+EVERYTHING = 10 ** 9
+
+
+def open_backend(kind, data_dir):
+    books = os.path.join(data_dir, "books.csv")
+    members = os.path.join(data_dir, "members.csv")
+    if kind == 'csv':
+        storage = CsvStorage(books, members,
+                             journal_path=os.path.join(data_dir, "library.journal"),
+                             snapshot_path=os.path.join(data_dir, "library.snap"))
+    else:
+        storage = SQLiteStorage(os.path.join(data_dir, "library.db"), books, members,
+                                cache=(kind == 'sqlite'))
+    lib = LibrarySystem(storage)
+    lib.load()
+    return lib
+
+
+def random_book(rng, isbn):
+    title = " ".join(rng.sample(WORDS, rng.randint(1, 2))).title()
+    return (isbn, title, rng.choice(AUTHORS), rng.randint(1950, 2020),
+            rng.choice(CATEGORIES), rng.randint(0, 3))
+
+
+def seed_files(data_dir, rng, books, members):
+    rows = [random_book(rng, f"978{i:010d}") for i in range(books)]
+    write_csv(os.path.join(data_dir, "books.csv"), BOOK_COLUMNS, rows)
+    write_csv(os.path.join(data_dir, "members.csv"), MEMBER_COLUMNS,
+              [[f"M-{i:05d}", f"Member {i}", ""] for i in range(members)])
+
+
+# ---------------------
+# Operations
+# ---------------------
+def next_operation(rng, ref, isbns, member_ids):
+    """A random (name, args) chosen against the reference's current state."""
+    roll = rng.random()
+    member_id = rng.choice(member_ids)
+    if roll < 0.35:
+        return 'borrow_book', (member_id, rng.choice(isbns))
+    if roll < 0.65:
+        member = ref.members.get_member(member_id)
+        if member.borrowed_books and rng.random() < 0.9:
+            return 'return_book', (member_id, rng.choice(member.borrowed_books))
+        return 'return_book', (member_id, rng.choice(isbns))
+    if roll < 0.75:
+        # Sometimes an ISBN that already exists (refused)
+        isbn = rng.choice(isbns) if rng.random() < 0.2 else f"979{len(isbns):010d}"
+        return 'add_book', random_book(rng, isbn)
+    if roll < 0.82:
+        return 'remove_book', (rng.choice(isbns),)
+    if roll < 0.88:
+        new_id = member_id if rng.random() < 0.2 else f"N-{len(member_ids):05d}"
+        return 'add_member', (new_id, f"Member {new_id}")
+    operations = []
+    for _ in range(rng.randint(2, 5)):
+        if rng.random() < 0.5:
+            operations.append({'op': 'borrow', 'member_id': rng.choice(member_ids),
+                               'isbn': rng.choice(isbns)})
+        else:
+            isbn, title, author, year, category, copies = random_book(rng, f"979{len(isbns):010d}")
+            isbns.append(isbn)
+            operations.append({'op': 'add_book', 'isbn': isbn, 'title': title, 'author': author,
+                               'year': year, 'category': category, 'copies': copies})
+    if rng.random() < 0.5:
+        # An operation that fails: an atomic batch rolls everything back
+        operations.append({'op': 'return', 'member_id': member_id, 'isbn': "000"})
+    return 'apply_batch', (operations, rng.random() < 0.5)
+
+
+def apply(lib, name, args):
+    result = getattr(lib, name)(*args)
+    lib.persist()
+    return result
+
+
+# ---------------------
+# Lookups compared across backends
+# ---------------------
+def state(lib, isbns, titles):
+    return {
+        'books': [(isbn, dict(data)) for isbn, data in lib.snapshot().iter_inorder()],
+        'count': (lib.count_books(), lib.count_members()),
+        'page': [isbn for isbn, _ in lib.list_books_page(5, 20)],
+        'after': [isbn for isbn, _ in lib.list_books_after(isbns[len(isbns) // 2], 20)],
+        'members': [(member_id, member.name, list(member.borrowed_books))
+                    for member_id, member in lib.list_members_page(0, EVERYTHING)],
+        'members_after': [member_id for member_id, _ in lib.list_members_after("M-00100", 20)],
+        'isbn': [[dict(data) for _, data in lib.find_by_isbn(isbn)] for isbn in isbns],
+        'holders': [[(member_id, copies) for member_id, _, copies in lib.book_holders(isbn)]
+                    for isbn in isbns],
+        # Which of several same-titled books is "newest" depends on load
+        # order, so compare the sets
+        'title': [sorted(isbn for isbn, _ in lib.find_by_title(title)) for title in titles],
+        'title_hit': [lib.search_by_title(title.upper()) is not None for title in titles],
+        'author': [sorted(isbn for isbn, _ in lib.find_by_author(author.lower()))
+                   for author in AUTHORS],
+        'text': [sorted(isbn for isbn, _ in lib.search_text(query, EVERYTHING))
+                 for query in WORDS + ["cafe", "ANGSTROM", "river garden", "lin fiction"]],
+        'complete': [sorted(isbn for isbn, _ in lib.autocomplete_titles(prefix, EVERYTHING))
+                     for prefix in ("r", "night ", "c", "zz")],
+        'categories': lib.list_categories(),
+        'filter': [[isbn for isbn, _ in lib.filter_books(category, 1970, 2000, available, 50)]
+                   for category in CATEGORIES + [None] for available in (False, True)],
+    }
+
+
+def compare(kind, expected, actual, when):
+    errors = []
+    for key, value in expected.items():
+        if actual[key] != value:
+            errors.append(f"{kind} {when}: {key} differs")
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check every storage backend against memory")
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--ops', type=int, default=3000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    kinds = ('csv', 'sqlite', 'sqlite-nocache')
+    errors = []
+    with tempfile.TemporaryDirectory(prefix="library-backends-") as root:
+        dirs = {}
+        for kind in ('reference',) + kinds:
+            dirs[kind] = os.path.join(root, kind)
+            os.mkdir(dirs[kind])
+            seed_files(dirs[kind], random.Random(args.seed), args.books, args.members)
+        ref = LibrarySystem(StorageBackend())
+        ref.load_books_from_csv(os.path.join(dirs['reference'], "books.csv"))
+        ref.load_members_from_csv(os.path.join(dirs['reference'], "members.csv"))
+        libs = {kind: open_backend(kind, dirs[kind]) for kind in kinds}
+
+        rng = random.Random(args.seed)
+        isbns = [isbn for isbn, _ in ref.list_all_books()]
+        member_ids = [member_id for member_id, _ in ref.list_members_page(0, EVERYTHING)]
+        counts = {}
+        for step in range(args.ops):
+            name, op_args = next_operation(rng, ref, isbns, member_ids)
+            expected = apply(ref, name, op_args)
+            counts[name] = counts.get(name, 0) + 1
+            if name == 'add_book' and expected:
+                isbns.append(op_args[0])
+            if name == 'add_member' and expected:
+                member_ids.append(op_args[0])
+            for kind, lib in libs.items():
+                actual = apply(lib, name, op_args)
+                if actual != expected:
+                    errors.append(f"{kind} step {step}: {name}{op_args} returned "
+                                  f"{actual!r}, expected {expected!r}")
+            if errors:
+                break
+        print("ran " + ", ".join(f"{count} {name}" for name, count in sorted(counts.items())))
+
+        titles = sorted({data['title'] for _, data in ref.list_all_books()})[:40]
+        expected = state(ref, isbns, titles)
+        for kind, lib in libs.items():
+            errors += compare(kind, expected, state(lib, isbns, titles), "after the run")
+            lib.close()
+        # What was persisted must load back the same
+        for kind in kinds:
+            lib = open_backend(kind, dirs[kind])
+            errors += compare(kind, expected, state(lib, isbns, titles), "after reopening")
+            lib.close()
+        print(f"{len(expected['books'])} books, {len(expected['members'])} members, "
+              f"{sum(len(m[2]) for m in expected['members'])} loans compared")
+
+    for error in errors:
+        print(f"FAIL {error}")
+    print("FAILED" if errors else "OK")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+# =========================
+# Microbenchmarks for the core data structures
+#
+#   python bench.py                       # 10k and 100k
+#   python bench.py --sizes 1000000       # 1M (slow: minutes)
+#   python bench.py -o run.json --compare baseline.json
+#   python bench.py --memory              # bytes per book by structure
+#
+# Results are JSON so runs from different commits can be diffed.
+# =========================
+
+import argparse
+import gc
+import inspect
+import json
+import linecache
+import os
+import platform
+import random
+import subprocess
+import sys
+import re
+import tempfile
+import time
+import tracemalloc
+
+from avl import AVLTree, BookRecord
+from hash import HashTable
+from hashes import AuthorIndex, TitleIndex, MemberDatabase
+from library_system import LibrarySystem, build_catalog
+
+WORDS = ("data structures algorithms introduction programming python modern "
+         "systems design theory digital signal circuits physics calculus "
+         "networks machine learning compiler operating database principles "
+         "applied advanced guide practical engineering analysis").split()
+CATEGORIES = ["Programming", "Engineering", "Science", "Novel", "Mathematics", "History"]
+
+
+# ---------------------
+# Synthetic data
+# ---------------------
+def generate_catalog(n, seed=42):
+    """n unique rows: (isbn, title, author, year, category, copies)."""
+    rng = random.Random(seed)
+    authors = [f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {i}"
+               for i in range(max(n // 20, 1))]
+    isbns = rng.sample(range(10 ** 12, 10 ** 13), n)
+    return [(str(isbn),
+             " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title() + f" {i}",
+             rng.choice(authors),
+             rng.randint(1950, 2024),
+             rng.choice(CATEGORIES),
+             rng.randint(1, 5)) for i, isbn in enumerate(isbns)]
+
+
+def generate_members(m):
+    return [(f"M{i:07d}", f"Member {i}") for i in range(m)]
+
+
+def book_value(row):
+    return BookRecord(row[1], row[2], row[3], row[4], row[5])
+
+
+# ---------------------
+# Timing
+# ---------------------
+def timed(fn, repeat, setup=None):
+    """
+    Best of `repeat` runs, GC disabled while timing. setup(), if given,
+    runs untimed before each run and its result is passed to fn.
+    """
+    best = None
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            fn(*args)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_size(n, repeat, seed=42):
+    catalog = generate_catalog(n, seed)
+    members = generate_members(max(n // 10, 1))
+    rng = random.Random(seed)
+    probe = [row[0] for row in rng.sample(catalog, min(n, 100000))]
+    results = {}
+
+    def record(name, ops, fn, setup=None):
+        seconds = timed(fn, repeat, setup)
+        results[name] = {'seconds': seconds, 'ops': ops,
+                         'ops_per_sec': ops / seconds if seconds else None}
+        print(f"  {name:<22} {seconds * 1000:10.1f} ms  {ops / seconds:14,.0f} ops/s",
+              flush=True)
+
+    # AVL tree
+    def avl_insert():
+        tree = AVLTree()
+        for row in catalog:
+            tree.insert(row[0], book_value(row))
+    record('avl_insert', n, avl_insert)
+
+    def avl_insert_persistent():
+        tree = AVLTree(persistent=True)
+        for row in catalog:
+            tree.insert(row[0], book_value(row))
+    record('avl_insert_persistent', n, avl_insert_persistent)
+
+    items = sorted((row[0], book_value(row)) for row in catalog)
+    tree = AVLTree()
+    tree.build_sorted(items)
+    record('avl_search', len(probe), lambda: [tree.search(isbn) for isbn in probe])
+    record('avl_inorder', n, tree.inorder)
+
+    def fresh_tree():
+        fresh = AVLTree()
+        fresh.build_sorted(items)
+        return fresh
+    record('avl_delete', len(probe), lambda t: [t.delete(isbn) for isbn in probe], fresh_tree)
+
+    # Hash table
+    keys = [row[0] for row in catalog]
+    def hash_insert():
+        table = HashTable()
+        for key in keys:
+            table.insert(key, key)
+    record('hash_insert', n, hash_insert)
+    table = HashTable()
+    for key in keys:
+        table.insert(key, key)
+    record('hash_search', len(probe), lambda: [table.search(key) for key in probe])
+
+    # Secondary indexes
+    titles = TitleIndex()
+    authors = AuthorIndex()
+    titles.bulk_add([(row[1], row[0]) for row in catalog])
+    authors.bulk_add([(row[2], row[0]) for row in catalog])
+    title_probe = [row[1] for row in rng.sample(catalog, min(n, 100000))]
+    author_probe = [row[2] for row in rng.sample(catalog, min(n, 100000))]
+    record('title_lookup', len(title_probe),
+           lambda: [titles.get_isbn(title) for title in title_probe])
+    record('author_lookup', len(author_probe),
+           lambda: [authors.get_books_list(author) for author in author_probe])
+
+    def member_insert():
+        db = MemberDatabase()
+        for member_id, name in members:
+            db.add_member(member_id, name)
+    record('member_insert', len(members), member_insert)
+
+    # Whole system: CSV round trip and circulation
+    with tempfile.TemporaryDirectory() as tmp:
+        books_csv = os.path.join(tmp, "books.csv")
+        members_csv = os.path.join(tmp, "members.csv")
+        lib = LibrarySystem()
+        lib._build_catalog(sorted((row[0], book_value(row)) for row in catalog))
+        for member_id, name in members:
+            lib.members.add_member(member_id, name)
+
+        record('csv_save', n, lambda: (lib.save_books(books_csv), lib.save_members(members_csv)))
+
+        def csv_load():
+            fresh = LibrarySystem()
+            fresh.load_books_from_csv(books_csv)
+            fresh.load_members_from_csv(members_csv)
+        record('csv_load', n, csv_load)
+
+        loans = [(members[i % len(members)][0], probe[i % len(probe)])
+                 for i in range(min(n, 50000))]
+        def borrow_return():
+            for member_id, isbn in loans:
+                if lib.borrow_book(member_id, isbn):
+                    lib.return_book(member_id, isbn)
+        record('borrow_return', len(loans), borrow_return)
+
+    return results
+
+
+# ---------------------
+# Memory
+# ---------------------
+# The structures build_catalog() fills, by argument name
+CATALOG_PARTS = {name for name in inspect.signature(build_catalog).parameters
+                 if name not in ('items', 'title_order', 'year_order')}
+
+
+def memory_profile(n, seed=42):
+    """
+    Live bytes per book after loading n books from CSV, split by the
+    structure that allocated them: the build_catalog() argument filled on
+    that line (or self.<attribute> elsewhere in library_system.py), or
+    'records' for the parsed rows.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "books.csv")
+        writer = LibrarySystem()
+        writer._build_catalog(sorted((row[0], book_value(row)) for row in generate_catalog(n, seed)))
+        writer.save_books(path)
+        del writer
+
+        gc.collect()
+        tracemalloc.start(64)
+        lib = LibrarySystem()
+        lib.load_books_from_csv(path)
+        gc.collect()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    parts = {}
+    for stat in snapshot.statistics('traceback'):
+        part = None
+        for frame in reversed(stat.traceback):
+            if frame.filename.endswith("library_system.py"):
+                line = linecache.getline(frame.filename, frame.lineno)
+                match = re.match(r"\s*(\w+)\.", line)
+                if match and match.group(1) in CATALOG_PARTS:
+                    part = match.group(1)
+                    break
+                match = re.search(r"self\.(\w+)\.", line)
+                if match and match.group(1) != 'lock':
+                    part = match.group(1)
+                    break
+                if part is None:
+                    part = 'records'
+        if part:
+            parts[part] = parts.get(part, 0) + stat.size
+    total = sum(parts.values())
+    return {
+        'bytes_per_book': total / n,
+        'parts': {name: size / n for name, size in sorted(parts.items())},
+    }
+
+
+# ---------------------
+# Reporting
+# ---------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """Print per-benchmark speed ratios; returns names slower than threshold."""
+    regressions = []
+    for size, benches in current['results'].items():
+        old = baseline.get('results', {}).get(size, {})
+        for name, result in benches.items():
+            if name not in old:
+                continue
+            ratio = result['seconds'] / old[name]['seconds']
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"  n={size:<8} {name:<22} {ratio:6.2f}x{flag}")
+            if flag:
+                regressions.append(f"{size}/{name}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark AVLTree, HashTable and the indexes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', help="write results JSON here")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="slowdown ratio reported as a regression")
+    parser.add_argument('--memory', action='store_true',
+                        help="also report memory per book by structure")
+    args = parser.parse_args(argv)
+
+    run = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'repeat': args.repeat,
+        'results': {},
+    }
+    for n in args.sizes:
+        print(f"n = {n:,}")
+        run['results'][str(n)] = run_size(n, args.repeat, args.seed)
+        if args.memory:
+            memory = memory_profile(n, args.seed)
+            run.setdefault('memory', {})[str(n)] = memory
+            for name, size in memory['parts'].items():
+                print(f"  mem {name:<18} {size:10.1f} B/book")
+            print(f"  mem {'total':<18} {memory['bytes_per_book']:10.1f} B/book")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(run, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        print(f"Compared with {baseline.get('commit')}:")
+        if compare(run, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
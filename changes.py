@@ -0,0 +1,88 @@
+# =========================
+# Change Feed
+# Sequence-numbered deltas in a bounded ring buffer, so clients that
+# already hold the data can catch up with small updates. Each change
+# carries the new absolute values (not +1/-1), so applying one twice is
+# harmless. A client whose cursor is older than the buffer, or from
+# another process (epoch), has to refetch everything.
+# =========================
+
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+import os
+import threading
+
+
+class ChangeLog:
+    def __init__(self, capacity=4096):
+        # Sequence numbers restart with the process; the epoch tells
+        # clients their cursor belongs to an earlier run
+        self.epoch = os.urandom(4).hex()
+        self.entries = deque(maxlen=capacity)
+        self.seq = 0      # last sequence number handed out
+        self.floor = 0    # changes up to here are no longer available
+        self.cond = threading.Condition()
+        # Changes of an open batch, not yet published (see grouped())
+        self.held = None
+
+    def record(self, kind, **fields):
+        if self.held is not None:
+            self.held.append((kind, fields))
+            return
+        with self.cond:
+            self._append(kind, fields)
+            self.cond.notify_all()
+
+    def _append(self, kind, fields):
+        self.seq += 1
+        if len(self.entries) == self.entries.maxlen:
+            self.floor = self.entries[0]['seq']
+        self.entries.append({'seq': self.seq, 'type': kind, **fields})
+
+    @contextmanager
+    def grouped(self):
+        """
+        Hold the changes recorded inside and publish them together on
+        exit, with one wake-up for waiting streams. Only used under the
+        library's writer lock, like record().
+        """
+        self.held = []
+        try:
+            yield
+        finally:
+            held, self.held = self.held, None
+            if held:
+                with self.cond:
+                    for kind, fields in held:
+                        self._append(kind, fields)
+                    self.cond.notify_all()
+
+    def discard(self):
+        """Drop the changes held so far (a batch that was rolled back)."""
+        self.held.clear()
+
+    def reset(self):
+        """Forget the history (after a bulk load): every client resyncs."""
+        with self.cond:
+            self.seq += 1
+            self.floor = self.seq
+            self.entries.clear()
+            self.cond.notify_all()
+
+    def since(self, seq, epoch=None):
+        """
+        (changes after seq, latest seq). The changes are None when the
+        client must refetch everything instead.
+        """
+        with self.cond:
+            if (epoch is not None and epoch != self.epoch) or not self.floor <= seq <= self.seq:
+                return None, self.seq
+            # entries hold floor+1 .. seq contiguously
+            return list(islice(self.entries, seq - self.floor, None)), self.seq
+
+    def wait(self, seq, epoch=None, timeout=None):
+        """since(), after blocking up to timeout for anything newer than seq."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq != seq, timeout)
+            return self.since(seq, epoch)
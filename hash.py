@@ -1,82 +1,185 @@
 # =========================
 # Hash Table with Chaining
+# Grows automatically to keep chains short
+#
+# One writer at a time (the caller's lock), but search() may run
+# alongside it without locking: a miss seen while a resize was relinking
+# the chains is retried on the new bucket array.
 # =========================
 
 class HashNode:
-    def __init__(self, key, value):
+    __slots__ = ('key', 'value', 'hash', 'next')
+
+    def __init__(self, key, value, hash_value):
         self.key = key          # key (string)
         self.value = value      # value (any object)
+        self.hash = hash_value  # cached full hash, reused when rehashing
         self.next = None        # next node in chain
 
 
 class HashTable:
-    def __init__(self, size=100):
-        self.size = size
+    def __init__(self, size=100, load_factor=0.75):
+        self.size = size                # number of buckets
+        self.load_factor = load_factor  # max entries per bucket before growing
+        self.count = 0                  # number of stored keys
         self.table = [None] * size
+        self.resizing = False           # chains are being relinked
+        # chains[n] = buckets holding n nodes (n >= 1), kept up to date
+        # so chain_stats() never walks the table
+        self.chains = [0]
+
+    def __len__(self):
+        return self.count
 
     # ---------------------
     # Hash Function
     # ---------------------
     def _hash(self, key):
         """
-        Polynomial rolling hash for strings
+        Built-in hash (C implementation, cached on str objects)
         """
-        prime = 31
-        hash_value = 0
-        for char in key:
-            hash_value = (hash_value * prime + ord(char)) % self.size
-        return hash_value
+        return hash(key)
 
     # ---------------------
     # Insert / Update
     # ---------------------
     def insert(self, key, value):
-        index = self._hash(key)
+        hash_value = self._hash(key)
+        index = hash_value % self.size
         head = self.table[index]
 
         # If key already exists → update
+        length = 0
         current = head
         while current:
-            if current.key == key:
+            if current.hash == hash_value and current.key == key:
                 current.value = value
                 return
             current = current.next
+            length += 1
 
         # Insert new node at head (chaining)
-        new_node = HashNode(key, value)
+        new_node = HashNode(key, value, hash_value)
         new_node.next = head
         self.table[index] = new_node
+        self.count += 1
+        chains = self.chains
+        if length:
+            chains[length] -= 1
+        length += 1
+        if length == len(chains):
+            chains.append(0)
+        chains[length] += 1
+
+        if self.count > self.size * self.load_factor:
+            self._resize(self.size * 2)
 
     # ---------------------
     # Search
     # ---------------------
     def search(self, key):
-        index = self._hash(key)
-        current = self.table[index]
+        hash_value = self._hash(key)
+        while True:
+            table = self.table
+            current = table[hash_value % len(table)]
 
-        while current:
-            if current.key == key:
-                return current.value
-            current = current.next
+            while current:
+                if current.hash == hash_value and current.key == key:
+                    return current.value
+                current = current.next
 
-        return None  # key not found
+            # A concurrent resize may have moved the node off this chain
+            if not self.resizing and self.table is table:
+                return None  # key not found
 
     # ---------------------
     # Delete
     # ---------------------
     def delete(self, key):
-        index = self._hash(key)
+        hash_value = self._hash(key)
+        index = hash_value % self.size
         current = self.table[index]
         prev = None
 
+        length = 0
         while current:
-            if current.key == key:
+            if current.hash == hash_value and current.key == key:
                 if prev:
                     prev.next = current.next
                 else:
                     self.table[index] = current.next
+                self.count -= 1
+                # Chain length = nodes before it + it + nodes after it
+                rest = current.next
+                length += 1
+                while rest:
+                    length += 1
+                    rest = rest.next
+                self.chains[length] -= 1
+                if length > 1:
+                    self.chains[length - 1] += 1
                 return True  # deleted successfully
             prev = current
             current = current.next
+            length += 1
 
         return False  # key not found
+
+    # ---------------------
+    # Rehash
+    # ---------------------
+    def _resize(self, new_size):
+        """
+        Move every node into a larger bucket array, reusing the cached hash
+        """
+        self.resizing = True
+        table = [None] * new_size
+        lengths = [0] * new_size
+        for head in self.table:
+            current = head
+            while current:
+                nxt = current.next
+                index = current.hash % new_size
+                current.next = table[index]
+                table[index] = current
+                lengths[index] += 1
+                current = nxt
+        self.table = table
+        self.size = new_size
+        self.resizing = False
+        self.chains = [0] * (max(lengths) + 1)
+        for length in lengths:
+            if length:
+                self.chains[length] += 1
+
+    def reserve(self, n):
+        """
+        Pre-size for n entries so a bulk load rehashes at most once
+        """
+        needed = int(n / self.load_factor) + 1
+        if needed > self.size:
+            self._resize(needed)
+
+    def keys(self):
+        """Yield every stored key (bucket order)."""
+        for head in self.table:
+            current = head
+            while current:
+                yield current.key
+                current = current.next
+
+    # ---------------------
+    # Chain statistics
+    # ---------------------
+    def chain_stats(self):
+        """O(longest chain): read from the counts kept by insert/delete."""
+        used = sum(self.chains)
+        max_chain = next((n for n in range(len(self.chains) - 1, 0, -1) if self.chains[n]), 0)
+        return {
+            'buckets': self.size,
+            'entries': self.count,
+            'load_factor': self.count / self.size,
+            'used_buckets': used,
+            'max_chain': max_chain,
+            'mean_chain': self.count / used if used else 0.0,
+        }
@@ -1,6 +1,16 @@
 from hash import HashTable
 from avl import AVLTree
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from itertools import islice
+import heapq
+import math
+import re
+import unicodedata
 class LinkedlistNode:
+    __slots__ = ('data', 'next')
+
     def __init__(self, value):
         self.data = value     # stores the value of the node
         self.next = None      # pointer to the next node
@@ -25,6 +35,20 @@ class slist:
                 return True
             current = current.next
         return False
+    def remove(self, value):
+        prev = None
+        current = self.head
+        while current:
+            if current.data == value:
+                if prev:
+                    prev.next = current.next
+                else:
+                    self.head = current.next
+                self.n -= 1
+                return True
+            prev = current
+            current = current.next
+        return False
     def to_list(self):
         result = []
         current = self.head
@@ -37,6 +61,7 @@ class slist:
 class AuthorIndex:
     def __init__(self):
         self.table = HashTable()
+        self.fuzzy = None  # FuzzyIndex, built on the first fuzzy query
 
     def normalize(self, name):
         return " ".join(name.lower().split())
@@ -48,12 +73,49 @@ class AuthorIndex:
 
         if isbn_list is None:
             isbn_list = slist()
+            if self.fuzzy is not None:
+                self.fuzzy.add(author)
 
         if not isbn_list.contains(isbn):
             isbn_list.insert_head(isbn)
 
         self.table.insert(author, isbn_list)
 
+    def bulk_add(self, pairs):
+        """Add many (author, isbn) pairs, building each author's list once."""
+        grouped = {}
+        for author, isbn in pairs:
+            grouped.setdefault(self.normalize(author), []).append(isbn)
+        self.table.reserve(len(self.table) + len(grouped))
+        for author, isbns in grouped.items():
+            isbn_list = self.table.search(author)
+            if isbn_list is None:
+                # Fresh list: callers pass unique ISBNs, skip the O(k) contains()
+                isbn_list = slist()
+                self.table.insert(author, isbn_list)
+                if self.fuzzy is not None:
+                    self.fuzzy.add(author)
+                for isbn in isbns:
+                    isbn_list.insert_head(isbn)
+                continue
+            for isbn in isbns:
+                if not isbn_list.contains(isbn):
+                    isbn_list.insert_head(isbn)
+
+    def remove_book(self, author, isbn):
+        author = self.normalize(author)
+        isbn_list = self.table.search(author)
+        if isbn_list is None or not isbn_list.remove(isbn):
+            return False
+        if not len(isbn_list):
+            self.table.delete(author)
+            if self.fuzzy is not None:
+                self.fuzzy.remove(author)
+                if self.fuzzy.stale():
+                    # Built aside and swapped in: readers keep the one they hold
+                    self.fuzzy = self.fuzzy.compacted()
+        return True
+
     def get_books(self, author):
         author = self.normalize(author)
         return self.table.search(author)  # returns slist
@@ -61,18 +123,68 @@ class AuthorIndex:
         s_list = self.get_books(author)
         return s_list.to_list() if s_list else []
 
+    def build_fuzzy(self):
+        if self.fuzzy is None:
+            fuzzy = FuzzyIndex()
+            fuzzy.bulk_add(self.table.keys())
+            self.fuzzy = fuzzy
+
+    def fuzzy_search(self, author, limit=10):
+        """(normalized author, edit distance) pairs close to author."""
+        self.build_fuzzy()
+        return self.fuzzy.search(self.normalize(author), limit)
+
 class MemberNode:
+    __slots__ = ('member_id', 'name', 'borrowed_books', 'loan_counts')
+
     def __init__(self, member_id, name):
         self.member_id = member_id
         self.name = name
-        self.borrowed_books = []  # list of ISBNs
+        self.borrowed_books = []  # list of ISBNs, in borrow order
+        self.loan_counts = {}     # isbn -> copies held, O(1) membership
 
     def can_borrow(self):
         return len(self.borrowed_books) < 5
 
+    def holds(self, isbn):
+        return isbn in self.loan_counts
+
+class LoanIndex:
+    """ISBN → {member_id: copies held}, so "who has this book" needs no member scan."""
+    def __init__(self):
+        self.table = HashTable()
+
+    def add(self, member_id, isbn):
+        holders = self.table.search(isbn)
+        if holders is None:
+            holders = {}
+            self.table.insert(isbn, holders)
+        holders[member_id] = holders.get(member_id, 0) + 1
+
+    def remove(self, member_id, isbn):
+        holders = self.table.search(isbn)
+        if holders is None or member_id not in holders:
+            return False
+        holders[member_id] -= 1
+        if not holders[member_id]:
+            del holders[member_id]
+            if not holders:
+                self.table.delete(isbn)
+        return True
+
+    def holders(self, isbn):
+        """(member_id, copies) pairs for an ISBN, in member-ID order."""
+        holders = self.table.search(isbn)
+        return sorted(holders.items()) if holders else []
+
 class MemberDatabase:
     def __init__(self):
         self.table = HashTable()
+        self.ids = []  # sorted member IDs, for stable paging
+        self.loans = LoanIndex()
+
+    def __len__(self):
+        return len(self.table)
 
     def add_member(self, member_id, name):
         if self.table.search(member_id) is not None:
@@ -80,6 +192,16 @@ class MemberDatabase:
 
         member = MemberNode(member_id, name)
         self.table.insert(member_id, member)
+        insort(self.ids, member_id)
+        return True
+
+    def remove_member(self, member_id):
+        """Drop a member with no loans; False if unknown or still borrowing."""
+        member = self.get_member(member_id)
+        if member is None or member.borrowed_books:
+            return False
+        self.table.delete(member_id)
+        del self.ids[bisect_left(self.ids, member_id)]
         return True
 
     def get_member(self, member_id):
@@ -94,17 +216,76 @@ class MemberDatabase:
         if not member.can_borrow():
             return False
 
-        member.borrowed_books.append(isbn)
+        self._add_loan(member, isbn)
         return True
 
     def return_book(self, member_id, isbn):
         member = self.get_member(member_id)
 
-        if member is None or isbn not in member.borrowed_books:
+        if member is None or not member.holds(isbn):
             return False
 
+        self._remove_loan(member, isbn)
+        return True
+
+    # ---------------------
+    # Loans (member side + LoanIndex kept in step)
+    # ---------------------
+    def _add_loan(self, member, isbn):
+        member.borrowed_books.append(isbn)
+        member.loan_counts[isbn] = member.loan_counts.get(isbn, 0) + 1
+        self.loans.add(member.member_id, isbn)
+
+    def _remove_loan(self, member, isbn):
         member.borrowed_books.remove(isbn)
+        member.loan_counts[isbn] -= 1
+        if not member.loan_counts[isbn]:
+            del member.loan_counts[isbn]
+        self.loans.remove(member.member_id, isbn)
+
+    def add_loan(self, member_id, isbn):
+        """Record a loan without the borrow limit (loading saved state)."""
+        member = self.get_member(member_id)
+        if member is None:
+            return False
+        self._add_loan(member, isbn)
         return True
+
+    def remove_loan(self, member_id, isbn):
+        member = self.get_member(member_id)
+        if member is None or not member.holds(isbn):
+            return False
+        self._remove_loan(member, isbn)
+        return True
+
+    def set_loans(self, member_id, isbns):
+        """Replace a member's loans (loading saved state)."""
+        member = self.get_member(member_id)
+        for isbn in member.borrowed_books:
+            self.loans.remove(member_id, isbn)
+        member.borrowed_books = []
+        member.loan_counts = {}
+        for isbn in isbns:
+            self._add_loan(member, isbn)
+
+    def holders(self, isbn):
+        return self.loans.holders(isbn)
+
+    def page(self, offset, limit):
+        """(member_id, MemberNode) pairs in member-ID order."""
+        return [(member_id, self.table.search(member_id))
+                for member_id in self.ids[offset:offset + limit]]
+
+    def page_after(self, member_id, limit):
+        start = bisect_right(self.ids, member_id)
+        return self.page(start, limit)
+
+    def iter_sorted(self, after=None):
+        """Yield (member_id, MemberNode) in member-ID order, after `after` if given."""
+        start = 0 if after is None else bisect_right(self.ids, after)
+        for member_id in islice(self.ids, start, None):
+            yield member_id, self.table.search(member_id)
+
     def table_items(self):
         """Yield (member_id, MemberNode) for all members."""
         for bucket in self.table.table:
@@ -113,23 +294,548 @@ class MemberDatabase:
                 yield current.key, current.value
                 current = current.next
 
+class PrefixIndex:
+    """
+    Normalized keys and their ISBNs in two parallel lists sorted by
+    (key, isbn); a prefix query is one bisect plus a scan over the matches.
+    """
+    def __init__(self):
+        self.keys = []
+        self.isbns = []
+
+    def _position(self, key, isbn):
+        lo = bisect_left(self.keys, key)
+        hi = bisect_right(self.keys, key, lo)
+        return bisect_left(self.isbns, isbn, lo, hi)
+
+    def add(self, key, isbn):
+        i = self._position(key, isbn)
+        self.keys.insert(i, key)
+        self.isbns.insert(i, isbn)
+
+    def bulk_add(self, pairs):
+        pairs = list(zip(self.keys, self.isbns)) + list(pairs)
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.isbns = [isbn for _, isbn in pairs]
+
+    def remove(self, key, isbn):
+        i = self._position(key, isbn)
+        if i < len(self.keys) and self.keys[i] == key and self.isbns[i] == isbn:
+            del self.keys[i]
+            del self.isbns[i]
+            return True
+        return False
+
+    def search(self, prefix, limit=10):
+        results = []
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(results) < limit:
+            if not self.keys[i].startswith(prefix):
+                break
+            results.append((self.keys[i], self.isbns[i]))
+            i += 1
+        return results
+
+class FuzzyIndex:
+    """
+    Trigram index over normalized keys for typo-tolerant lookup. A key
+    within edit distance d of the query shares all but at most 3·d of the
+    query's trigrams, so only keys passing that count filter (best overlap
+    first) are ranked by a banded edit distance. Removed keys leave a None
+    tombstone; once stale(), the owner swaps in compacted(). Keys and
+    posting arrays are only appended to (a key before its postings), so
+    search() can run while the writer adds or removes.
+    """
+    COUNT_BUDGET = 50000       # postings counted per query before skipping common trigrams
+    TOMBSTONE_FRACTION = 0.5   # share of key ids removed before compacting
+
+    def __init__(self):
+        self.keys = []     # key id -> normalized key
+        self.grams = {}    # trigram -> array of key ids, ascending
+        self.removed = 0   # tombstones in keys
+
+    @staticmethod
+    def trigrams(key):
+        padded = f" {key} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, key):
+        key_id = len(self.keys)
+        self.keys.append(key)
+        grams = self.grams
+        for gram in self.trigrams(key):
+            ids = grams.get(gram)
+            if ids is None:
+                grams[gram] = array('i', (key_id,))
+            else:
+                ids.append(key_id)
+
+    def bulk_add(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def remove(self, key):
+        lists = sorted((self.grams.get(gram, ()) for gram in self.trigrams(key)), key=len)
+        if not lists:
+            return False  # blank key: no trigrams, never findable anyway
+        for key_id in lists[0]:
+            if self.keys[key_id] == key:
+                self.keys[key_id] = None
+                self.removed += 1
+                return True
+        return False
+
+    def stale(self):
+        return self.removed > len(self.keys) * self.TOMBSTONE_FRACTION
+
+    def compacted(self):
+        """A new index over the live keys only: O(keys), amortized over the removals."""
+        fuzzy = FuzzyIndex()
+        fuzzy.bulk_add(key for key in self.keys if key is not None)
+        return fuzzy
+
+    def search(self, query, limit=10, max_distance=None, max_checks=200):
+        """
+        Up to limit (key, distance) pairs, closest first. max_distance
+        defaults to 1 per 4 characters (1..3); only the max_checks keys
+        sharing the most trigrams with the query get an edit distance.
+        """
+        if not query:
+            return []
+        if max_distance is None:
+            max_distance = min(3, max(1, len(query) // 4))
+        # Rarest trigrams first. A match misses at most 3·d of the trigrams
+        # counted, so after 3·d+1 of them it must already be a candidate;
+        # past that, very common trigrams are skipped once over budget.
+        grams = sorted(self.trigrams(query), key=lambda gram: len(self.grams.get(gram, ())))
+        shared = Counter()
+        counted = total = 0
+        for gram in grams:
+            ids = self.grams.get(gram, ())
+            if counted > 3 * max_distance and total + len(ids) > self.COUNT_BUDGET:
+                break
+            shared.update(ids)  # counts in C
+            counted += 1
+            total += len(ids)
+        need = counted - 3 * max_distance
+
+        candidates = [(count, key_id) for key_id, count in shared.items() if count >= need]
+        candidates.sort(reverse=True)
+        ranked = []
+        checked = 0
+        for count, key_id in candidates:
+            if checked == max_checks:
+                break
+            key = self.keys[key_id]
+            if key is None or abs(len(key) - len(query)) > max_distance:
+                continue
+            checked += 1
+            distance = edit_distance(query, key, max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, -count, key))
+        ranked.sort()
+        return [(key, distance) for distance, _, key in ranked[:limit]]
+
+def edit_distance(a, b, bound):
+    """Levenshtein distance of a and b, or bound + 1 once it must exceed bound."""
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if len(a) > len(b):
+        a, b = b, a
+    over = bound + 1
+    prev = [j if j <= bound else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        cur = [over] * (len(b) + 1)
+        if i <= bound:
+            cur[0] = i
+        lo = max(1, i - bound)
+        hi = min(len(b), i + bound)
+        best = cur[lo - 1]
+        for j in range(lo, hi + 1):
+            value = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+            cur[j] = value if value < over else over
+            if value < best:
+                best = value
+        if best > bound:
+            return over
+        prev = cur
+    return prev[len(b)]
+
 class TitleIndex:
+    """
+    Normalized title -> slist of ISBNs, newest first; several books may
+    share a title.
+    """
     def __init__(self):
         self.table = HashTable()
+        self.prefixes = PrefixIndex()
+        self.fuzzy = None  # FuzzyIndex, built on the first fuzzy query
 
     def normalize(self, title):
         return " ".join(title.lower().split())
 
     def add_book(self, title, isbn):
         title = self.normalize(title)
-        self.table.insert(title, isbn)
+        isbn_list = self.table.search(title)
+        if isbn_list is None:
+            isbn_list = slist()
+            self.table.insert(title, isbn_list)
+            if self.fuzzy is not None:
+                self.fuzzy.add(title)
+        if not isbn_list.contains(isbn):
+            isbn_list.insert_head(isbn)
+            self.prefixes.add(title, isbn)
+
+    def bulk_add(self, pairs):
+        """Add many (title, isbn) pairs after sizing the table once."""
+        if len(self.table):
+            for title, isbn in pairs:
+                self.add_book(title, isbn)
+            return
+        grouped = {}
+        normalized = []
+        for title, isbn in pairs:
+            title = self.normalize(title)
+            grouped.setdefault(title, []).append(isbn)
+            normalized.append((title, isbn))
+        self.table.reserve(len(grouped))
+        for title, isbns in grouped.items():
+            # Fresh table: callers pass unique ISBNs, skip the O(k) contains()
+            isbn_list = slist()
+            for isbn in isbns:
+                isbn_list.insert_head(isbn)
+            self.table.insert(title, isbn_list)
+        self.prefixes.bulk_add(normalized)
+        if self.fuzzy is not None:
+            self.fuzzy.bulk_add(grouped)
 
-    def remove_book(self, title):
+    def remove_book(self, title, isbn):
+        """Drop isbn from title; the title goes once no book has it."""
         title = self.normalize(title)
-        self.table.delete(title)
+        isbn_list = self.table.search(title)
+        if isbn_list is None or not isbn_list.remove(isbn):
+            return False
+        self.prefixes.remove(title, isbn)
+        if not len(isbn_list):
+            self.table.delete(title)
+            if self.fuzzy is not None:
+                self.fuzzy.remove(title)
+                if self.fuzzy.stale():
+                    # Built aside and swapped in: readers keep the one they hold
+                    self.fuzzy = self.fuzzy.compacted()
+        return True
 
     def get_isbn(self, title):
-        title = self.normalize(title)
-        return self.table.search(title)
+        """The most recently added book with this title, or None."""
+        isbn_list = self.table.search(self.normalize(title))
+        head = isbn_list.head if isbn_list is not None else None
+        return head.data if head else None
+
+    def get_books_list(self, title):
+        isbn_list = self.table.search(self.normalize(title))
+        return isbn_list.to_list() if isbn_list else []
+
     def exists(self, title):
         return self.get_isbn(title) is not None
+
+    def complete(self, prefix, limit=10):
+        """Up to limit (normalized title, isbn) pairs starting with prefix."""
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+        return self.prefixes.search(prefix, limit)
+
+    def build_fuzzy(self):
+        if self.fuzzy is None:
+            fuzzy = FuzzyIndex()
+            fuzzy.bulk_add(self.table.keys())
+            self.fuzzy = fuzzy
+
+    def fuzzy_search(self, title, limit=10):
+        """(normalized title, edit distance) pairs close to title."""
+        self.build_fuzzy()
+        return self.fuzzy.search(self.normalize(title), limit)
+
+class FullTextIndex:
+    """
+    Inverted index over title, author and category. Each term maps to an
+    ISBN-sorted posting list with a parallel int array of term frequencies, so
+    AND queries intersect by bisecting the shorter lists; hits are ranked
+    with BM25. After restore() the posting lists stay packed in the dump
+    arrays and each term's list is built the first time it is used.
+    """
+    TOKEN = re.compile(r"[^\W_]+")   # runs of letters/digits in any script
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}     # term -> sorted [isbn, ...]
+        self.freqs = {}        # term -> array of tf, parallel to postings
+        self.doc_len = {}      # isbn -> number of tokens
+        self.total_len = 0
+        self.packed = None     # (term -> slot, isbns, offsets, rows, freqs) from restore()
+
+    def _posting(self, term):
+        """(isbns, freqs) for term, unpacking it on first use; None if absent."""
+        isbns = self.postings.get(term)
+        if isbns is not None:
+            return isbns, self.freqs[term]
+        if self.packed is None:
+            return None
+        slots, by_row, offsets, rows, freqs = self.packed
+        t = slots.pop(term, None)
+        if t is None:
+            return None
+        lo, hi = offsets[t], offsets[t + 1]
+        isbns = self.postings[term] = [by_row[r] for r in rows[lo:hi]]
+        tfs = self.freqs[term] = freqs[lo:hi]
+        if not slots:
+            self.packed = None
+        return isbns, tfs
+
+    def _unpack_all(self):
+        if self.packed is not None:
+            for term in list(self.packed[0]):
+                self._posting(term)
+
+    def tokenize(self, text):
+        """Casefolded tokens with accents dropped: "Ümlaut" -> "umlaut"."""
+        text = text.casefold()
+        if not text.isascii():
+            text = "".join(ch for ch in unicodedata.normalize('NFKD', text)
+                           if not unicodedata.combining(ch))
+        return self.TOKEN.findall(text)
+
+    def _terms(self, title, author, category):
+        counts = {}
+        tokens = self.tokenize(title) + self.tokenize(author) + self.tokenize(category)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        return counts, len(tokens)
+
+    def add_book(self, isbn, title, author, category):
+        if isbn in self.doc_len:
+            return
+        counts, length = self._terms(title, author, category)
+        self.doc_len[isbn] = length
+        self.total_len += length
+        for term, tf in counts.items():
+            posting = self._posting(term)
+            if posting is None:
+                isbns = self.postings[term] = []
+                freqs = self.freqs[term] = array('i')
+            else:
+                isbns, freqs = posting
+            i = bisect_left(isbns, isbn)
+            isbns.insert(i, isbn)
+            freqs.insert(i, tf)
+
+    def remove_book(self, isbn, title, author, category):
+        length = self.doc_len.pop(isbn, None)
+        if length is None:
+            return
+        self.total_len -= length
+        counts, _ = self._terms(title, author, category)
+        for term in counts:
+            posting = self._posting(term)
+            if posting is None:
+                continue
+            isbns = posting[0]
+            i = bisect_left(isbns, isbn)
+            if i < len(isbns) and isbns[i] == isbn:
+                if len(isbns) == 1:
+                    del self.postings[term]
+                    del self.freqs[term]
+                else:
+                    del isbns[i]
+                    del self.freqs[term][i]
+
+    def bulk_add(self, items):
+        """
+        items: (isbn, title, author, category) in ascending ISBN order.
+        Into an empty index every posting list is built by appending.
+        """
+        if self.doc_len:
+            for item in items:
+                self.add_book(*item)
+            return
+        postings, freqs = self.postings, self.freqs
+        for isbn, title, author, category in items:
+            counts, length = self._terms(title, author, category)
+            self.doc_len[isbn] = length
+            self.total_len += length
+            for term, tf in counts.items():
+                isbns = postings.get(term)
+                if isbns is None:
+                    postings[term] = [isbn]
+                    freqs[term] = array('i', (tf,))
+                else:
+                    isbns.append(isbn)
+                    freqs[term].append(tf)
+
+    # ---------------------
+    # Prebuilt form (binary snapshot)
+    # ---------------------
+    def dump(self, row_of):
+        """
+        Flatten to (terms, offsets, rows, freqs, lengths) where rows refer
+        to catalog positions via row_of (isbn -> row).
+        """
+        self._unpack_all()
+        terms, offsets, rows, freqs = [], [0], [], []
+        for term, isbns in self.postings.items():
+            terms.append(term)
+            rows.extend(row_of[isbn] for isbn in isbns)
+            freqs.extend(self.freqs[term])
+            offsets.append(len(rows))
+        return terms, offsets, rows, freqs
+
+    def restore(self, isbns, lengths, terms, offsets, rows, freqs):
+        """
+        Load a dump() into an empty index without re-tokenizing. The
+        arrays are kept as they are; posting lists are unpacked on demand.
+        """
+        self.doc_len = dict(zip(isbns, lengths))
+        self.total_len = sum(lengths)
+        if terms:
+            self.packed = (dict(zip(terms, range(len(terms)))), isbns,
+                           offsets, rows, array('i', freqs))
+
+    # ---------------------
+    # Query
+    # ---------------------
+    def _intersect(self, terms):
+        """Candidate ISBNs containing every term, shortest list first."""
+        lists = sorted(((self._posting(term) or ([],))[0] for term in terms), key=len)
+        result = lists[0]
+        for other in lists[1:]:
+            if not result:
+                break
+            merged = []
+            lo = 0
+            for isbn in result:
+                lo = bisect_left(other, isbn, lo)
+                if lo == len(other):
+                    break
+                if other[lo] == isbn:
+                    merged.append(isbn)
+            result = merged
+        return result
+
+    def search(self, query, k=10):
+        """Top-k (score, isbn) pairs for documents matching all query terms."""
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if not terms or not self.doc_len:
+            return []
+        candidates = self._intersect(terms)
+        if not candidates:
+            return []
+
+        n = len(self.doc_len)
+        avg_len = self.total_len / n
+        scores = dict.fromkeys(candidates, 0.0)
+        for term in terms:
+            isbns, freqs = self._posting(term)
+            df = len(isbns)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            lo = 0
+            for isbn in candidates:
+                lo = bisect_left(isbns, isbn, lo)
+                tf = freqs[lo]
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[isbn] / avg_len)
+                scores[isbn] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, ((score, isbn) for isbn, score in scores.items()))
+
+class YearIndex:
+    """
+    Years (int array) and ISBNs in parallel, sorted by (year, isbn); a year
+    range is two bisects and a slice.
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self.years = array('i')
+        self.isbns = []
+
+    def __len__(self):
+        return len(self.isbns)
+
+    def _position(self, year, isbn):
+        lo = bisect_left(self.years, year)
+        hi = bisect_right(self.years, year, lo)
+        return bisect_left(self.isbns, isbn, lo, hi)
+
+    def add(self, year, isbn):
+        i = self._position(year, isbn)
+        self.years.insert(i, year)
+        self.isbns.insert(i, isbn)
+
+    def bulk_add(self, pairs):
+        pairs = list(zip(self.years, self.isbns)) + list(pairs)
+        pairs.sort()
+        self.years = array('i', [year for year, _ in pairs])
+        self.isbns = [isbn for _, isbn in pairs]
+
+    def remove(self, year, isbn):
+        i = self._position(year, isbn)
+        if i < len(self.isbns) and self.years[i] == year and self.isbns[i] == isbn:
+            del self.years[i]
+            del self.isbns[i]
+            return True
+        return False
+
+    def range(self, year_from=None, year_to=None):
+        """Yield (year, isbn) with year_from <= year <= year_to, oldest first."""
+        lo = 0 if year_from is None else bisect_left(self.years, year_from)
+        hi = len(self.years) if year_to is None else bisect_right(self.years, year_to, lo)
+        for i in range(lo, hi):
+            yield self.years[i], self.isbns[i]
+
+class CategoryIndex:
+    """Category → YearIndex, so category + year range is O(log n + k)."""
+    def __init__(self):
+        self.table = HashTable()
+
+    def normalize(self, category):
+        return " ".join(category.lower().split())
+
+    def add_book(self, category, year, isbn):
+        key = self.normalize(category)
+        years = self.table.search(key)
+        if years is None:
+            years = YearIndex(category.strip())
+            self.table.insert(key, years)
+        years.add(year, isbn)
+
+    def bulk_add(self, triples):
+        """Add many (category, year, isbn) triples, sorting each category once."""
+        grouped = {}
+        for category, year, isbn in triples:
+            key = self.normalize(category)
+            if key not in grouped:
+                grouped[key] = (category.strip(), [])
+            grouped[key][1].append((year, isbn))
+        for key, (name, pairs) in grouped.items():
+            years = self.table.search(key)
+            if years is None:
+                years = YearIndex(name)
+                self.table.insert(key, years)
+            years.bulk_add(pairs)
+
+    def remove_book(self, category, year, isbn):
+        years = self.table.search(self.normalize(category))
+        return years.remove(year, isbn) if years else False
+
+    def get(self, category):
+        return self.table.search(self.normalize(category))
+
+    def categories(self):
+        """(category name, number of books) for every non-empty category."""
+        result = []
+        for bucket in self.table.table:
+            current = bucket
+            while current:
+                if len(current.value):
+                    result.append((current.value.name, len(current.value)))
+                current = current.next
+        return sorted(result)
@@ -0,0 +1,247 @@
+# =========================
+# Parallel Catalog Import
+# The file is cut into byte ranges on line boundaries; a process pool
+# parses and validates each range and returns its rows sorted by ISBN.
+# The sorted runs are merged (first occurrence of an ISBN wins, as in
+# file order) straight into LibrarySystem's O(n) bulk build.
+#
+#   python importer.py vendor.csv [--workers 8] [--errors rejected.csv]
+#
+# Rows are split on newlines, so a quoted field containing a line break
+# is only supported when it does not straddle a chunk boundary; such
+# rows are reported as rejected rather than silently mangled.
+# =========================
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import csv
+import heapq
+import io
+import os
+import sys
+import time
+
+COLUMNS = ("ISBN", "Title", "Author", "Year", "Category", "TotalCopies")
+CHUNK_SIZE = 8 * 1024 * 1024
+# Below this a process pool costs more than it saves
+PARALLEL_MIN_BYTES = 4 * 1024 * 1024
+
+
+class CatalogImportError(ValueError):
+    pass
+
+
+# ---------------------
+# Chunking
+# ---------------------
+def read_header(path):
+    """(column positions for COLUMNS, byte offset of the first data row)."""
+    with open(path, 'rb') as file:
+        line = file.readline()
+        header = next(csv.reader([line.decode('utf-8-sig')]), [])
+        missing = [name for name in COLUMNS if name not in header]
+        if missing:
+            raise CatalogImportError(f"missing column(s): {', '.join(missing)}")
+        return tuple(header.index(name) for name in COLUMNS), file.tell()
+
+
+def split_ranges(path, start, chunk_size=CHUNK_SIZE):
+    """Byte ranges of about chunk_size, each ending just after a newline."""
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, 'rb') as file:
+        while start < size:
+            end = start + chunk_size
+            if end >= size:
+                end = size
+            else:
+                file.seek(end)
+                file.readline()
+                end = file.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+# ---------------------
+# Worker
+# ---------------------
+def parse_row(row, positions):
+    """(isbn, title, author, year, category, copies) or raises ValueError."""
+    if len(row) < len(COLUMNS):
+        raise ValueError(f"expected {len(COLUMNS)} fields, got {len(row)}")
+    isbn, title, author, year, category, copies = (row[i] for i in positions)
+    if not isbn.strip():
+        raise ValueError("missing ISBN")
+    if not title.strip():
+        raise ValueError("missing title")
+    if not author.strip():
+        raise ValueError("missing author")
+    if "\ufffd" in isbn + title + author + category:
+        raise ValueError("invalid UTF-8")
+    try:
+        year = int(year)
+    except ValueError:
+        raise ValueError(f"bad year {year!r}")
+    try:
+        copies = int(copies)
+    except ValueError:
+        raise ValueError(f"bad copy count {copies!r}")
+    if copies < 0:
+        raise ValueError(f"bad copy count {copies!r}")
+    return isbn, title, author, year, category, copies
+
+
+def parse_chunk(path, start, end, positions):
+    """
+    Parse one byte range. Returns (rows sorted by ISBN, rejected, lines)
+    where rejected holds (line within the chunk, reason, raw fields).
+    """
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+    rows = []
+    rejected = []
+    reader = csv.reader(io.StringIO(data.decode('utf-8', errors='replace'), newline=''))
+    for raw in reader:
+        if not raw:
+            continue
+        try:
+            rows.append(parse_row(raw, positions))
+        except (ValueError, IndexError) as e:
+            rejected.append((reader.line_num, str(e), raw))
+    rows.sort(key=lambda row: row[0])  # stable: file order kept per ISBN
+    return rows, rejected, data.count(b"\n")
+
+
+# ---------------------
+# Pipeline
+# ---------------------
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on every platform
+        return os.cpu_count() or 1
+
+
+def read_catalog(path, workers=None, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Parse and validate a catalog CSV in parallel. Returns (rows, rejected,
+    stats): rows are unique (isbn, title, author, year, category, copies)
+    tuples in ISBN order, rejected are (line, reason, raw fields).
+    progress(done_bytes, total_bytes) is called as chunks finish.
+    """
+    start = time.perf_counter()
+    positions, data_start = read_header(path)
+    ranges = split_ranges(path, data_start, chunk_size)
+    total = os.path.getsize(path)
+    if workers is None:
+        workers = available_cpus()
+    if total < PARALLEL_MIN_BYTES or len(ranges) == 1:
+        workers = 1
+
+    results = [None] * len(ranges)
+    done = data_start
+    if workers == 1:
+        for i, (lo, hi) in enumerate(ranges):
+            results[i] = parse_chunk(path, lo, hi, positions)
+            done += hi - lo
+            if progress:
+                progress(done, total)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(parse_chunk, path, lo, hi, positions): i
+                       for i, (lo, hi) in enumerate(ranges)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                done += ranges[i][1] - ranges[i][0]
+                if progress:
+                    progress(done, total)
+
+    # Chunk-relative line numbers → file line numbers (header is line 1)
+    rejected = []
+    line = 1
+    for _, chunk_rejected, lines in results:
+        rejected.extend((line + n, reason, raw) for n, reason, raw in chunk_rejected)
+        line += lines
+
+    # k-way merge; on equal ISBNs the earlier chunk comes first
+    rows = []
+    parsed = 0
+    for row in heapq.merge(*(chunk_rows for chunk_rows, _, _ in results), key=lambda r: r[0]):
+        parsed += 1
+        if not rows or rows[-1][0] != row[0]:
+            rows.append(row)
+    return rows, rejected, {
+        'rows': parsed + len(rejected),
+        'valid': parsed,
+        'unique': len(rows),
+        'duplicates': parsed - len(rows),
+        'rejected': len(rejected),
+        'chunks': len(ranges),
+        'workers': workers,
+        'parse_seconds': time.perf_counter() - start,
+    }
+
+
+def write_rejected(path, rejected):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Line", "Reason", "Fields"])
+        for line, reason, raw in rejected:
+            writer.writerow([line, reason, *raw])
+
+
+# ---------------------
+# CLI
+# ---------------------
+def print_progress(done, total):
+    print(f"\r  parsed {done / total:6.1%} ({done / 1e6:,.1f} of {total / 1e6:,.1f} MB)",
+          end="", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a catalog CSV into the library")
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, help="parser processes (default: CPUs available)")
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_SIZE / 2 ** 20)
+    parser.add_argument('--errors', default="rejected_rows.csv",
+                        help="where to write rows that failed validation")
+    parser.add_argument('--dry-run', action='store_true', help="validate only, change nothing")
+    args = parser.parse_args(argv)
+    chunk_size = int(args.chunk_mb * 2 ** 20)
+
+    try:
+        if args.dry_run:
+            _, rejected, stats = read_catalog(args.path, args.workers, chunk_size, print_progress)
+            if rejected:
+                write_rejected(args.errors, rejected)
+        else:
+            from library_system import LibrarySystem
+            from storage import default_storage
+            lib = LibrarySystem(default_storage())
+            lib.load()
+            try:
+                stats = lib.import_books(args.path, args.workers, print_progress,
+                                         args.errors, chunk_size)
+            finally:
+                lib.close()
+    except (OSError, CatalogImportError) as e:
+        print(f"Import failed: {e}")
+        return 1
+
+    print(f"\n{stats['rows']:,} rows: {stats['unique']:,} unique books, "
+          f"{stats['duplicates']:,} duplicate ISBNs, {stats['rejected']:,} rejected "
+          f"({stats['workers']} worker(s), {stats['chunks']} chunk(s), "
+          f"parsed in {stats['parse_seconds']:.2f} s)")
+    if 'imported' in stats:
+        print(f"{stats['imported']:,} imported, {stats['existing']:,} already in the catalog, "
+              f"{stats['seconds']:.2f} s total")
+    if stats['rejected']:
+        print(f"Rejected rows written to {args.errors}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
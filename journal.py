@@ -0,0 +1,228 @@
+# =========================
+# Append-only Transaction Journal
+# One JSON event per line
+#
+# Compaction rotates the journal aside (<path>.old) before folding it
+# into the CSVs, and renames it to <path>.folded once the new CSVs are
+# complete. A <path>.old found on open was never folded, so its events
+# are merged back in front of the live journal.
+#
+# Records are appended under the library's writer lock; commit() may run
+# without it, so a slow fsync does not hold up readers or other writers.
+# sync_lock keeps an fsync from overlapping a close, rotation or rollback.
+# =========================
+
+import json
+import os
+import threading
+import time
+
+
+class TransactionJournal:
+    def __init__(self, path="library.journal", sync_every=32, sync_interval=1.0,
+                 compact_every=1000):
+        self.path = path
+        self.sync_every = sync_every          # group commit: fsync after N records
+        self.sync_interval = sync_interval    # ... or after this many seconds
+        self.compact_every = compact_every    # fold into CSV after N records
+        self.written = 0                      # records appended, ever
+        self.synced = 0                       # ... of which known to be fsynced
+        self.last_sync = time.monotonic()
+        self.sync_lock = threading.Lock()
+        self._restore_rotated()
+        self._drop_torn_tail()
+        self.records = self._count_records()  # records since last compaction
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    @property
+    def pending(self):
+        """Records written but not fsynced."""
+        return self.written - self.synced
+
+    @property
+    def rotated_path(self):
+        return self.path + ".old"
+
+    @property
+    def folded_path(self):
+        return self.path + ".folded"
+
+    def _restore_rotated(self):
+        # An interrupted compaction: its events come before the live ones
+        try:
+            with open(self.rotated_path, encoding='utf-8') as file:
+                events = file.read()
+        except FileNotFoundError:
+            return
+        if events and not events.endswith("\n"):
+            events += "\n"  # keep a torn last line from swallowing the next one
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                events += file.read()
+        except FileNotFoundError:
+            pass
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(events)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        os.remove(self.rotated_path)
+
+    def _drop_torn_tail(self):
+        # A crash mid-append leaves a partial last line; cut it off so the
+        # next record starts on a line of its own instead of joining it
+        try:
+            with open(self.path, 'rb+') as file:
+                end = file.seek(0, os.SEEK_END)
+                keep = end
+                while keep > 0:
+                    step = min(4096, keep)
+                    file.seek(keep - step)
+                    newline = file.read(step).rfind(b"\n")
+                    if newline >= 0:
+                        keep = keep - step + newline + 1
+                        break
+                    keep -= step
+                if keep != end:
+                    file.truncate(keep)
+                    os.fsync(file.fileno())
+        except FileNotFoundError:
+            pass
+
+    def _count_records(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return sum(1 for line in file if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    # ---------------------
+    # Append
+    # ---------------------
+    def append(self, op, **fields):
+        """
+        Write one event and hand it to the OS; fsync is left to commit()
+        """
+        event = {'op': op, **fields}
+        self.file.write(json.dumps(event, separators=(',', ':')) + "\n")
+        self.file.flush()
+        self.written += 1
+        self.records += 1
+
+    def append_many(self, op, events):
+        """
+        append() for a batch of field dicts: one write, one flush
+        """
+        lines = [json.dumps({'op': op, **fields}, separators=(',', ':')) for fields in events]
+        if not lines:
+            return
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+        self.written += len(lines)
+        self.records += len(lines)
+
+    # ---------------------
+    # Batches
+    # ---------------------
+    def mark(self):
+        """Position to rollback() to if the records that follow are abandoned."""
+        self.file.flush()
+        return self.file.tell(), self.written, self.records
+
+    def rollback(self, mark):
+        """Cut off everything appended since mark()."""
+        offset, written, self.records = mark
+        with self.sync_lock:
+            self.file.truncate(offset)
+            # truncate() leaves the position where it was; later writes must
+            # not leave a gap
+            self.file.seek(offset)
+            self.written = written
+            self.synced = min(self.synced, written)
+
+    # ---------------------
+    # Group commit
+    # ---------------------
+    def due(self):
+        """True once enough records have piled up or enough time has passed."""
+        return bool(self.pending) and (
+            self.pending >= self.sync_every
+            or time.monotonic() - self.last_sync >= self.sync_interval)
+
+    def commit(self, force=False):
+        """
+        fsync pending records if due() (or force). Safe without the writer
+        lock: everything written before the call is covered, and records
+        appended meanwhile wait for the next commit. Returns True if it
+        synced.
+        """
+        if not (force and self.pending or self.due()):
+            return False
+        with self.sync_lock:
+            written = self.written
+            if written == self.synced or self.file.closed:
+                return False  # another commit got there first
+            os.fsync(self.file.fileno())
+            self.synced = max(self.synced, written)
+            self.last_sync = time.monotonic()
+            return True
+
+    def needs_compaction(self):
+        return self.records >= self.compact_every
+
+    # ---------------------
+    # Replay
+    # ---------------------
+    def replay(self):
+        """
+        Yield events in write order. A torn trailing line (crash
+        mid-append) is skipped.
+        """
+        self.file.flush()
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                for line in file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            return
+
+    # ---------------------
+    # Rotation (compaction)
+    # ---------------------
+    def rotate(self):
+        """
+        Move the journal aside to rotated_path and start an empty one.
+        The caller folds the rotated events into its snapshot files, then
+        calls folded() and, once those files are in place, discard_folded().
+        """
+        self.commit(force=True)
+        with self.sync_lock:
+            self.file.close()
+            # A fold that failed left its events here: keep them
+            self._restore_rotated()
+            os.replace(self.path, self.rotated_path)
+            self.file = open(self.path, 'a', encoding='utf-8')
+            os.fsync(self.file.fileno())
+            self.synced = self.written
+            self.records = 0
+            self.last_sync = time.monotonic()
+
+    def folded(self):
+        """Commit point: the rotated events are covered by complete snapshot files."""
+        os.replace(self.rotated_path, self.folded_path)
+
+    def discard_folded(self):
+        os.remove(self.folded_path)
+
+    def close(self):
+        if not self.file.closed:
+            self.commit(force=True)
+            with self.sync_lock:
+                self.file.close()
@@ -1,93 +1,382 @@
-from avl import AVLTree
-from hashes import TitleIndex, AuthorIndex, MemberDatabase
+from avl import AVLTree, BookRecord
+from metrics import Metrics
+from changes import ChangeLog
+from hashes import TitleIndex, AuthorIndex, MemberDatabase, FullTextIndex, CategoryIndex, YearIndex
+from snapshot import SnapshotReader, write_snapshot, encode_strings, encode_ints
+from storage import CsvStorage, StorageError
+from importer import read_catalog, write_rejected, CHUNK_SIZE
 import csv
+import heapq
+import io
+import os
+import threading
+import time
+from itertools import islice
+
+SNAPSHOT_SECTIONS = ('isbn', 'title', 'author', 'category', 'year', 'copies',
+                     'titleord', 'yearord', 'ft_term', 'ft_off', 'ft_row', 'ft_tf',
+                     'ft_len', 'mem_id', 'mem_name', 'mem_loan')
+
+BOOK_COLUMNS = ["ISBN", "Title", "Author", "Year", "Category", "TotalCopies"]
+MEMBER_COLUMNS = ["MemberID", "Name", "BorrowedBooks"]
+# Rows per locked step of a streaming export
+EXPORT_BATCH = 1000
+BATCH_OPERATIONS = ('borrow', 'return', 'add_book', 'add_member')
+
+
+class _BatchAborted(Exception):
+    pass
+
+
+def book_row(isbn, data):
+    return [isbn, data.get('title', ''), data.get('author', ''), data.get('year', ''),
+            data.get('category', ''), data.get('available_copies', '')]
+
+
+def member_row(member_id, member):
+    return [member_id, member.name, ";".join(member.borrowed_books)]
+
+
+def build_catalog(items, books, title_index, author_index, text_index, category_index,
+                  year_index, title_order=None, year_order=None):
+    """
+    Fill an empty tree and indexes from ISBN-sorted (isbn, data) items.
+    title_order/year_order are optional row permutations (from a
+    snapshot) that hand the indexes pre-sorted input, so their sorts run
+    in linear time. text_index=None leaves the full-text index to the
+    caller (a snapshot restores it prebuilt).
+    """
+    books.build_sorted(items)
+    by_title = items if title_order is None else [items[i] for i in title_order]
+    by_year = items if year_order is None else [items[i] for i in year_order]
+    title_index.bulk_add([(data['title'], isbn) for isbn, data in by_title])
+    author_index.bulk_add([(data['author'], isbn) for isbn, data in items])
+    if text_index is not None:
+        text_index.bulk_add([(isbn, data['title'], data['author'], data['category'])
+                             for isbn, data in items])
+    category_index.bulk_add([(data['category'], data['year'], isbn)
+                             for isbn, data in by_year])
+    year_index.bulk_add([(data['year'], isbn) for isbn, data in by_year])
+
+
+def write_csv(filepath, header, rows):
+    """
+    Write a CSV to a temp file and rename it into place, so a crash
+    never leaves a half-written file behind.
+    """
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        writer.writerows(rows)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, filepath)
+
 
 class LibrarySystem:
-    def __init__(self):
-        self.books = AVLTree()
+    def __init__(self, storage=None, persistent=True):
+        # Single-writer model: every mutation (and its storage write) holds
+        # this lock, so check-then-update in borrow/return is atomic across
+        # Flask worker threads; the journal fsync happens after it is
+        # released (persist()). Lookups by ISBN walk the persistent tree
+        # without it, and so do title, author and fuzzy lookups (hash
+        # tables, linked lists and an append-only trigram index, which
+        # readers can walk mid-update). Prefix, full-text, category and
+        # year lookups keep parallel arrays that writers update in several
+        # steps, so they take the lock.
+        self.lock = threading.RLock()
+        # Bumped on every successful mutation; response caches key on it
+        self.version = 0
+        # Path-copying tree: readers take O(1) snapshots instead of locks
+        self.books = AVLTree(persistent=persistent)
         self.title_index = TitleIndex()
         self.author_index = AuthorIndex()
+        self.text_index = FullTextIndex()
+        self.category_index = CategoryIndex()
+        self.year_index = YearIndex()
         self.members = MemberDatabase()
+        # Request latencies, save timings etc. (see metrics.py)
+        self.metrics = Metrics()
+        # Recent changes for /api/changes and its event stream
+        self.changes = ChangeLog()
+        # Durable home of the data (see storage.py); defaults to the
+        # original books.csv/members.csv rewrite-on-save behaviour
+        self.storage = storage if storage is not None else CsvStorage()
+        self.storage.bind(self)
+        # Set while apply_batch() runs: persist() waits for the batch end
+        self.batching = False
+
     def load_members_from_csv(self, filepath="members.csv"):
-        try:
-            with open(filepath, newline='', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    self.members.add_member(row["MemberID"], row["Name"])
-                    member = self.members.get_member(row["MemberID"])
-                    if row["BorrowedBooks"]:
-                        member.borrowed_books = row["BorrowedBooks"].split(";")
-        except FileNotFoundError:
-            # No members.csv yet, that's fine
-            pass
+        with self.lock:
+            try:
+                with open(filepath, newline='', encoding='utf-8') as file:
+                    reader = csv.DictReader(file)
+                    for row in reader:
+                        self.members.add_member(row["MemberID"], row["Name"])
+                        if row["BorrowedBooks"]:
+                            self.members.set_loans(row["MemberID"],
+                                                   row["BorrowedBooks"].split(";"))
+            except FileNotFoundError:
+                # No members.csv yet, that's fine
+                pass
+            self.version += 1
 
     # --------------------
     # Save members to CSV
     # --------------------
-    def save_members(self, filepath="members.csv"):
-        with open(filepath, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(["MemberID", "Name", "BorrowedBooks"])
-            for member_id, member in self.members.table_items():
-                borrowed = ";".join(member.borrowed_books)
-                writer.writerow([member_id, member.name, borrowed])
+    def save_members(self, filepath="members.csv", members=None):
+        """members: rows from capture(), written without the lock."""
+        if members is None:
+            with self.lock:
+                return self.save_members(filepath, (
+                    (member_id, member.name, member.borrowed_books)
+                    for member_id, member in self.members.iter_sorted()))
+        start = time.perf_counter()
+        write_csv(filepath, MEMBER_COLUMNS,
+                  ([member_id, name, ";".join(loans)] for member_id, name, loans in members))
+        self.metrics.observe_save('members', time.perf_counter() - start,
+                                  os.path.getsize(filepath))
     # --------------------
     # Add a book
     # --------------------
     def add_book(self, ISBN, title, author, year, category, copies, save=True):
-        if self.books.search(ISBN):
-            return False
+        with self.lock:
+            if self.books.search(ISBN):
+                return False
 
-        book_data = {
-            'title': title,
-            'author': author,
-            'year': year,
-            'category': category,
-            'available_copies': copies
-        }
+            book_data = BookRecord(title, author, year, category, copies)
+            if save:
+                self.storage.add_book(ISBN, book_data)
 
-        self.books.insert(ISBN, book_data)
-        self.title_index.add_book(title, ISBN)
-        self.author_index.add_book(author, ISBN)
+            self.books.insert(ISBN, book_data)
+            self.title_index.add_book(title, ISBN)
+            self.author_index.add_book(author, ISBN)
+            self.text_index.add_book(ISBN, title, author, category)
+            self.category_index.add_book(category, year, ISBN)
+            self.year_index.add(year, ISBN)
+            self.version += 1
+            self.changes.record('add_book', isbn=ISBN, title=title, author=author, year=year,
+                                category=category, available_copies=copies)
 
         if save:
-            self.save_books("books.csv")
+            self.persist()
+        return True
+
+    # --------------------
+    # Remove a book
+    # --------------------
+    def remove_book(self, ISBN, save=True):
+        """
+        Withdraw a book from the catalog and every index. Refused (False)
+        if the book is unknown or any copy is still on loan.
+        """
+        with self.lock:
+            node = self.books.search(ISBN)
+            if node is None or self.members.holders(ISBN):
+                return False
+            data = node.value
+            if save:
+                self.storage.remove_book(ISBN)
+
+            self.books.delete(ISBN)
+            self.title_index.remove_book(data['title'], ISBN)
+            self.author_index.remove_book(data['author'], ISBN)
+            self.text_index.remove_book(ISBN, data['title'], data['author'], data['category'])
+            self.category_index.remove_book(data['category'], data['year'], ISBN)
+            self.year_index.remove(data['year'], ISBN)
+            self.version += 1
+            self.changes.record('remove_book', isbn=ISBN)
+
+        if save:
+            self.persist()
         return True
 
     # --------------------
     # Save books to CSV
     # --------------------
-    def save_books(self, filepath="books.csv"):
-        books = self.books.inorder()
-        with open(filepath, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow(["ISBN", "Title", "Author", "Year", "Category", "TotalCopies"])
-            for isbn, data in books:
-                writer.writerow([
-                    isbn,
-                    data.get('title', ''),
-                    data.get('author', ''),
-                    data.get('year', ''),
-                    data.get('category', ''),
-                    data.get('available_copies', '')
-                ])
+    def save_books(self, filepath="books.csv", books=None):
+        """books: a tree from capture(), written without the lock."""
+        if books is None:
+            with self.lock:
+                return self.save_books(filepath, self.books)
+        start = time.perf_counter()
+        write_csv(filepath, BOOK_COLUMNS,
+                  (book_row(isbn, data) for isbn, data in books.iter_inorder()))
+        self.metrics.observe_save('books', time.perf_counter() - start,
+                                  os.path.getsize(filepath))
+
+    # --------------------
+    # Streaming CSV export
+    # --------------------
+    def export_books_csv(self, batch=EXPORT_BATCH):
+        """books.csv as a stream of text chunks (see _stream_csv)."""
+        return self._stream_csv(BOOK_COLUMNS, self.snapshot().iter_inorder, book_row, batch)
+
+    def export_members_csv(self, batch=EXPORT_BATCH):
+        return self._stream_csv(MEMBER_COLUMNS, self.members.iter_sorted, member_row, batch)
+
+    def _stream_csv(self, header, walk, to_row, batch):
+        """
+        Yield CSV text `batch` rows at a time. Each batch is formatted
+        under the lock and the walk resumes after the last key sent, so a
+        slow download holds writers up for one batch at most, concurrent
+        changes cannot derail the iterator, and memory stays at one batch.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        last = None
+        while True:
+            count = 0
+            with self.lock:
+                for key, value in islice(walk(last), batch):
+                    writer.writerow(to_row(key, value))
+                    last = key
+                    count += 1
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            if count < batch:
+                return
 
     # --------------------
     # Load books from CSV
     # --------------------
-    def load_books_from_csv(self, filepath):
-        with open(filepath, newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                self.add_book(
-                    row['ISBN'],
-                    row['Title'],
-                    row['Author'],
-                    int(row['Year']),
-                    row['Category'],
-                    int(row['TotalCopies']),
-                    save=False  # avoid overwriting CSV
-                )
+    def load_books_from_csv(self, filepath, bulk=True):
+        """
+        Import the catalog from CSV. Into an empty tree the rows are
+        bulk-built in O(n) (save_books writes them ISBN-sorted, so the sort
+        is usually skipped); otherwise each row goes through add_book.
+        Returns load statistics.
+        """
+        with self.lock:
+            start = time.perf_counter()
+            with open(filepath, newline='', encoding='utf-8') as file:
+                reader = csv.DictReader(file)
+                if bulk and self.books.root is None:
+                    rows, presorted = self._bulk_load_books(reader)
+                else:
+                    rows, presorted = 0, False
+                    for row in reader:
+                        rows += 1
+                        self.add_book(
+                            row['ISBN'],
+                            row['Title'],
+                            row['Author'],
+                            int(row['Year']),
+                            row['Category'],
+                            int(row['TotalCopies']),
+                            save=False  # avoid overwriting CSV
+                        )
+            self.version += 1
+            self.last_load_stats = {
+                'rows': rows,
+                'books': self.books.size,
+                'presorted': presorted,
+                'seconds': time.perf_counter() - start,
+            }
+            return self.last_load_stats
+
+    def import_books(self, filepath, workers=None, progress=None, errors_path=None,
+                     chunk_size=CHUNK_SIZE):
+        """
+        Import a (possibly very large) catalog CSV: parsed and validated in
+        a process pool (importer.py), bad rows skipped and written to
+        errors_path instead of aborting, ISBNs already in the catalog left
+        alone. New books are reported to the storage backend in one batch.
+        Returns import statistics.
+        """
+        rows, rejected, stats = read_catalog(filepath, workers, chunk_size, progress)
+        if errors_path and rejected:
+            write_rejected(errors_path, rejected)
+        with self.lock:
+            start = time.perf_counter()
+            empty = self.books.root is None
+            items = [(isbn, BookRecord(title, author, year, category, copies))
+                     for isbn, title, author, year, category, copies in rows
+                     if empty or not self.books.search(isbn)]
+            if items:
+                self.storage.add_books(items)
+                if self.storage.serves_reads:
+                    pass  # the backend's indexes have them already
+                elif empty:
+                    self._build_catalog(items)
+                    self.changes.reset()
+                elif len(items) * 8 > self.books.size:
+                    # Many sorted-array index inserts cost O(n) each; one
+                    # O(n) rebuild from the merged runs is far cheaper
+                    self._rebuild_catalog(items)
+                    self.changes.reset()
+                else:
+                    for isbn, data in items:
+                        self.add_book(isbn, data['title'], data['author'], data['year'],
+                                      data['category'], data['available_copies'], save=False)
+                self.version += 1
+            stats['imported'] = len(items)
+            stats['existing'] = len(rows) - len(items)
+            stats['build_seconds'] = time.perf_counter() - start
+        self.persist()
+        stats['seconds'] = stats['parse_seconds'] + stats['build_seconds']
+        return stats
+
+    def _bulk_load_books(self, reader):
+        items = []
+        presorted = True
+        prev = None
+        for row in reader:
+            isbn = row['ISBN']
+            if prev is not None and isbn <= prev:
+                presorted = False
+            prev = isbn
+            items.append((isbn, BookRecord(
+                row['Title'],
+                row['Author'],
+                int(row['Year']),
+                row['Category'],
+                int(row['TotalCopies'])
+            )))
+        rows = len(items)
+
+        if not presorted:
+            # Stable sort + keep first occurrence, same as add_book skipping duplicates
+            items.sort(key=lambda item: item[0])
+            unique = []
+            for item in items:
+                if not unique or unique[-1][0] != item[0]:
+                    unique.append(item)
+            items = unique
+
+        self._build_catalog(items)
+        return rows, presorted
+
+    def _rebuild_catalog(self, items):
+        """
+        Rebuild the tree and indexes from the current catalog plus the
+        ISBN-sorted new items. Built off to the side and swapped in, so
+        lock-free readers never see a half-built tree.
+        """
+        merged = list(heapq.merge(self.books.inorder(), items, key=lambda item: item[0]))
+        books = AVLTree(self.books.persistent)
+        title_index = TitleIndex()
+        author_index = AuthorIndex()
+        text_index = FullTextIndex()
+        category_index = CategoryIndex()
+        year_index = YearIndex()
+        build_catalog(merged, books, title_index, author_index, text_index,
+                      category_index, year_index)
+        self.title_index = title_index
+        self.author_index = author_index
+        self.text_index = text_index
+        self.category_index = category_index
+        self.year_index = year_index
+        self.books = books
+
+    def _build_catalog(self, items, title_order=None, year_order=None, text_index=True):
+        """Build this library's (empty) tree and indexes; see build_catalog()."""
+        build_catalog(items, self.books, self.title_index, self.author_index,
+                      self.text_index if text_index else None, self.category_index,
+                      self.year_index, title_order, year_order)
 
     # --------------------
     # Search operations
@@ -104,38 +393,506 @@ class LibrarySystem:
         return node.value if node else None
 
     def search_by_author(self, author):
-        isbns = self.author_index.get_books_list(author)
-        return [self.books.search(isbn).value for isbn in isbns if self.books.search(isbn)]
+        return [data for _, data in self.find_by_author(author)]
+
+    # (isbn, record) variants: one tree lookup per hit, no ISBN recovery needed
+    def find_by_isbn(self, ISBN):
+        node = self.books.search(ISBN)
+        return [(ISBN, node.value)] if node else []
+
+    def find_by_title(self, title):
+        results = []
+        for isbn in self.title_index.get_books_list(title):
+            results.extend(self.find_by_isbn(isbn))
+        return results
+
+    def autocomplete_titles(self, prefix, limit=10):
+        """Books whose normalized title starts with prefix, in title order."""
+        with self.lock:
+            hits = self.title_index.complete(prefix, limit)
+        results = []
+        for _, isbn in hits:
+            results.extend(self.find_by_isbn(isbn))
+        return results
+
+    def search_text(self, query, k=20):
+        """Keyword search over title/author/category, best BM25 match first."""
+        with self.lock:
+            hits = self.text_index.search(query, k)
+        results = []
+        for _, isbn in hits:
+            results.extend(self.find_by_isbn(isbn))
+        return results
+
+    def search_fuzzy(self, query, limit=20):
+        """
+        Typo-tolerant lookup: books whose title or author is within a small
+        edit distance of the query, closest first (titles before authors on
+        ties).
+        """
+        titles, authors = self.title_index, self.author_index
+        if titles.fuzzy is None or authors.fuzzy is None:
+            with self.lock:
+                # One-time trigram build; writers keep the indexes current after
+                titles.build_fuzzy()
+                authors.build_fuzzy()
+        matches = [(distance, 0, key) for key, distance in titles.fuzzy_search(query, limit)]
+        matches += [(distance, 1, key) for key, distance in authors.fuzzy_search(query, limit)]
+        matches.sort()
+
+        results = []
+        seen = set()
+        for _, kind, key in matches:
+            index = titles if kind == 0 else authors
+            for isbn in index.get_books_list(key):
+                if isbn in seen:
+                    continue
+                seen.add(isbn)
+                results.extend(self.find_by_isbn(isbn))
+                if len(results) >= limit:
+                    return results
+        return results
+
+    def filter_books(self, category=None, year_from=None, year_to=None,
+                     available_only=False, limit=50):
+        """
+        Faceted browse by category and/or year range, oldest first.
+        Walks only the matching index slice: O(log n + k).
+        Copy counts are read from the live records, so available_only
+        always reflects the latest borrow/return.
+        """
+        with self.lock:
+            if category:
+                years = self.category_index.get(category)
+                if years is None:
+                    return []
+            else:
+                years = self.year_index
+            results = []
+            for _, isbn in years.range(year_from, year_to):
+                if len(results) >= limit:
+                    break
+                node = self.books.search(isbn)
+                if not node:
+                    continue
+                if available_only and node.value['available_copies'] <= 0:
+                    continue
+                results.append((isbn, node.value))
+            return results
+
+    def list_categories(self):
+        with self.lock:
+            return self.category_index.categories()
+
+    def find_by_author(self, author):
+        results = []
+        for isbn in self.author_index.get_books_list(author):
+            node = self.books.search(isbn)
+            if node:
+                results.append((isbn, node.value))
+        return results
 
     # --------------------
     # Members
     # --------------------
     def add_member(self, member_id, name):
-        return self.members.add_member(member_id, name)
+        with self.lock:
+            if self.members.get_member(member_id) is not None:
+                return False
+            self.storage.add_member(member_id, name)
+            self.members.add_member(member_id, name)
+            self.version += 1
+            self.changes.record('add_member', member_id=member_id, name=name)
+            return True
+
+    # Member reads combine the member table, the sorted ID list and the
+    # loan index, which writers update in several steps: read under the lock
+    def get_member(self, member_id):
+        with self.lock:
+            return self.members.get_member(member_id)
+
+    def list_members(self):
+        """Every (member_id, MemberNode), in table order."""
+        with self.lock:
+            return list(self.members.table_items())
+
+    def list_members_page(self, offset=0, limit=50):
+        with self.lock:
+            return self.members.page(max(offset, 0), max(limit, 0))
+
+    def list_members_after(self, member_id, limit=50):
+        with self.lock:
+            return self.members.page_after(member_id, max(limit, 0))
+
+    def count_members(self):
+        return len(self.members)
+
+    def borrowed_details(self, members):
+        """
+        For (member_id, MemberNode) pairs, list (member_id, member,
+        [(isbn, data), ...]) resolving every borrowed ISBN with a single
+        batched tree traversal instead of one search per loan.
+        """
+        members = list(members)
+        with self.lock:
+            loans = [list(member.borrowed_books) for _, member in members]
+            nodes = self.books.search_many(isbn for isbns in loans for isbn in isbns)
+            return [(member_id, member, [(isbn, nodes[isbn].value)
+                                         for isbn in isbns if isbn in nodes])
+                    for (member_id, member), isbns in zip(members, loans)]
+
+    def book_holders(self, ISBN):
+        """(member_id, member, copies) for every member holding ISBN, from the loan index."""
+        with self.lock:
+            return [(member_id, self.members.get_member(member_id), copies)
+                    for member_id, copies in self.members.holders(ISBN)]
 
     # --------------------
     # Borrow / Return
     # --------------------
     def borrow_book(self, member_id, ISBN):
-        book_node = self.books.search(ISBN)
-        if not book_node or book_node.value['available_copies'] <= 0:
-            return False
-        if not self.members.borrow_book(member_id, ISBN):
-            return False
-        book_node.value['available_copies'] -= 1
-        return True
+        with self.lock:
+            book_node = self.books.search(ISBN)
+            if not book_node or book_node.value['available_copies'] <= 0:
+                return False
+            member = self.members.get_member(member_id)
+            if member is None or not member.can_borrow():
+                return False
+            self.storage.borrow(member_id, ISBN)
+            self.members.borrow_book(member_id, ISBN)
+            self.adjust_copies(book_node, -1)
+            self.version += 1
+            self._record_loan('borrow', member_id, ISBN)
+            return True
 
     def return_book(self, member_id, ISBN):
+        with self.lock:
+            book_node = self.books.search(ISBN)
+            if not book_node:
+                return False
+            member = self.members.get_member(member_id)
+            if member is None or not member.holds(ISBN):
+                return False
+            self.storage.return_book(member_id, ISBN)
+            self.members.return_book(member_id, ISBN)
+            self.adjust_copies(book_node, 1)
+            self.version += 1
+            self._record_loan('return', member_id, ISBN)
+            return True
+
+    def borrow_refusal(self, member_id, ISBN):
+        """Why borrow_book(member_id, ISBN) fails, for messages."""
+        with self.lock:
+            member = self.members.get_member(member_id)
+            if not member:
+                return 'Member not found'
+            if not member.can_borrow():
+                return 'Borrow limit reached (max 5 books)'
+            return 'Book not available'
+
+    def return_refusal(self, member_id, ISBN):
+        """Why return_book(member_id, ISBN) fails, for messages."""
+        with self.lock:
+            if not self.books.search(ISBN):
+                return 'Book not found'
+            if not self.members.get_member(member_id):
+                return 'Member not found'
+            return 'Member has not borrowed this book'
+
+    def _record_loan(self, kind, member_id, ISBN):
+        # Both read back after the change (a backend-served member is a copy)
+        self.changes.record(kind, isbn=ISBN, member_id=member_id,
+                            available_copies=self.books.search(ISBN).value['available_copies'],
+                            borrowed_count=len(self.members.get_member(member_id).borrowed_books))
+
+    def adjust_copies(self, book_node, delta):
+        """
+        Change a book's available copies. Records are replaced, never
+        modified, so snapshots taken earlier keep their counts.
+        """
+        record = book_node.value
+        self.books.update(book_node.key, record.replace(
+            available_copies=record.available_copies + delta))
+
+    # --------------------
+    # Batched transactions
+    # --------------------
+    def apply_batch(self, operations, atomic=False):
+        """
+        Apply a list of operations, e.g. {'op': 'return', 'member_id': ...,
+        'isbn': ...} (ops: BATCH_OPERATIONS), in order under one hold of
+        the writer lock, with one storage batch and one persist() at the
+        end. With atomic=True the first failure rolls back everything
+        applied before it. Returns {'committed', 'aborted_at', 'applied',
+        'failed', 'results'}: aborted_at is the index of the operation that
+        rolled an atomic batch back (else None), results hold one {'index',
+        'op', 'success', 'message'} per operation.
+        """
+        ops = [operation.get('op') if isinstance(operation, dict) else None
+               for operation in operations]
+        results = []
+        undo = []
+        aborted_at = None
+        with self.lock, self.changes.grouped():
+            self.batching = True
+            try:
+                with self.storage.batch():
+                    for index, operation in enumerate(operations):
+                        success, message = self._apply_operation(ops[index], operation, undo)
+                        results.append({'index': index, 'op': ops[index],
+                                        'success': success, 'message': message})
+                        if atomic and not success:
+                            raise _BatchAborted
+            except BaseException as e:
+                # Storage has dropped the batch; take memory back to match
+                for step in reversed(undo):
+                    step()
+                self.changes.discard()
+                self.version += 1
+                if not isinstance(e, _BatchAborted):
+                    raise
+                aborted_at = len(results) - 1
+                for result in results[:-1]:
+                    result.update(success=False, message='Rolled back')
+                results.extend({'index': index, 'op': ops[index], 'success': False,
+                                'message': 'Not applied'}
+                               for index in range(len(results), len(operations)))
+            finally:
+                self.batching = False
+        if aborted_at is None and undo:
+            self.persist()
+        applied = len(undo) if aborted_at is None else 0
+        return {'committed': aborted_at is None, 'aborted_at': aborted_at, 'applied': applied,
+                'failed': len(results) - applied, 'results': results}
+
+    def _apply_operation(self, op, operation, undo):
+        """
+        One batch operation → (success, message). On success the step
+        that reverses it in memory is appended to undo.
+        """
+        if op not in BATCH_OPERATIONS:
+            return False, f'Unknown operation {op!r}'
+        try:
+            if op == 'add_book':
+                ISBN = str(operation['isbn'])
+                fields = (str(operation['title']), str(operation['author']),
+                          int(operation['year']), str(operation['category']),
+                          int(operation['copies']))
+            elif op == 'add_member':
+                member_id, name = str(operation['member_id']), str(operation['name'])
+            else:
+                member_id, ISBN = str(operation['member_id']), str(operation['isbn'])
+        except KeyError as e:
+            return False, f'Missing field {e.args[0]!r}'
+        except (TypeError, ValueError) as e:
+            return False, f'Invalid field: {e}'
+
+        # Storage is told first and may refuse; memory is then untouched
+        try:
+            if op in ('borrow', 'return'):
+                member = self.members.get_member(member_id)
+                loans = list(member.borrowed_books) if member else []
+            if op == 'borrow':
+                if not self.borrow_book(member_id, ISBN):
+                    return False, self.borrow_refusal(member_id, ISBN)
+                undo.append(lambda: self._undo_loan(member_id, ISBN, loans, 1))
+                return True, 'Book borrowed successfully'
+            if op == 'return':
+                if not self.return_book(member_id, ISBN):
+                    return False, self.return_refusal(member_id, ISBN)
+                undo.append(lambda: self._undo_loan(member_id, ISBN, loans, -1))
+                return True, 'Book returned successfully'
+            if op == 'add_book':
+                if not self.add_book(ISBN, *fields):
+                    return False, 'Book already exists'
+                # The title index keeps every ISBN per title, so this takes
+                # out only the new book; a same-titled one stays findable
+                undo.append(lambda: self.remove_book(ISBN, save=False))
+                return True, 'Book added successfully'
+            if not self.add_member(member_id, name):
+                return False, 'Member already exists'
+            undo.append(lambda: self.members.remove_member(member_id))
+            return True, 'Member added successfully'
+        except StorageError as e:
+            return False, str(e)
+
+    def _undo_loan(self, member_id, ISBN, loans, delta):
+        """
+        Reverse a borrow (delta=1) or return (delta=-1) in memory only:
+        the member's loans go back to the list saved before it.
+        """
+        self.members.set_loans(member_id, loans)
         book_node = self.books.search(ISBN)
-        if not book_node:
-            return False
-        if not self.members.return_book(member_id, ISBN):
-            return False
-        book_node.value['available_copies'] += 1
-        return True
+        if book_node:  # gone if a backend rolled back the batch that added it
+            self.adjust_copies(book_node, delta)
 
     # --------------------
     # List all books
     # --------------------
+    def snapshot(self):
+        """
+        The catalog tree as of now, in O(1): a read-only view that stays
+        consistent however long it is walked (see AVLTree.snapshot).
+        """
+        return self.books.snapshot()
+
     def list_all_books(self):
         return self.books.inorder()
+
+    def list_books_page(self, offset=0, limit=50):
+        """(isbn, data) pairs at positions offset..offset+limit in ISBN order."""
+        return self.books.page(max(offset, 0), max(limit, 0))
+
+    def list_books_after(self, ISBN, limit=50):
+        """Cursor pagination: up to limit books with ISBN greater than the cursor."""
+        return self.books.page_after(ISBN, max(limit, 0))
+
+    def count_books(self):
+        return self.books.size
+
+    # --------------------
+    # Persistence (delegated to the storage backend)
+    # --------------------
+    def load(self):
+        """Fill the system from its storage backend; returns load statistics."""
+        with self.lock:
+            stats = self.storage.load_into(self)
+            # Replayed journal entries are not news to anyone
+            self.changes.reset()
+            return stats
+
+    def persist(self):
+        """
+        Make recent transactions durable: a group commit for a journal,
+        a CSV rewrite without one, nothing extra for SQLite. The journal
+        fsync runs after the writer lock is released, so call this outside
+        the lock for readers not to wait on the disk.
+        """
+        with self.lock:
+            if self.batching:
+                return
+            self.storage.commit()
+        self.storage.sync()
+
+    def compact(self):
+        """Fold the journal into the storage files now (see CsvStorage.compact)."""
+        self.storage.compact()
+
+    def close(self):
+        with self.lock:
+            self.storage.close()
+
+    # --------------------
+    # Binary snapshot
+    # --------------------
+    def capture(self):
+        """
+        (books, members) for the CSV and snapshot writers, so they can run
+        without the lock: an O(1) snapshot of the catalog tree and
+        (member_id, name, loans) rows, copied in O(members).
+        """
+        with self.lock:
+            books = self.books.snapshot()
+            if books is self.books:
+                # In-place tree: later writes would show through, copy it
+                books = AVLTree(persistent=True)
+                books.build_sorted(self.books.inorder())
+            members = [(member_id, member.name, tuple(member.borrowed_books))
+                       for member_id, member in self.members.iter_sorted()]
+        return books, members
+
+    def save_snapshot(self, filepath, captured=None):
+        """
+        Write a binary snapshot of capture() (taken now by default). Runs
+        outside the lock; the full-text data is re-derived from the
+        captured records rather than read from the live index.
+        """
+        start = time.perf_counter()
+        tree, members = captured if captured is not None else self.capture()
+        books = tree.inorder()
+        data = [value for _, value in books]
+        normalize = self.title_index.normalize
+        title_order = sorted(range(len(books)),
+                             key=lambda i: (normalize(data[i]['title']), books[i][0]))
+        year_order = sorted(range(len(books)),
+                            key=lambda i: (data[i]['year'], books[i][0]))
+        row_of = {isbn: i for i, (isbn, _) in enumerate(books)}
+        text_index = FullTextIndex()
+        text_index.bulk_add([(isbn, d['title'], d['author'], d['category']) for isbn, d in books])
+        terms, offsets, rows, freqs = text_index.dump(row_of)
+        write_snapshot(filepath, [
+            ('isbn', encode_strings(isbn for isbn, _ in books)),
+            ('title', encode_strings(d['title'] for d in data)),
+            ('author', encode_strings(d['author'] for d in data)),
+            ('category', encode_strings(d['category'] for d in data)),
+            ('year', encode_ints(d['year'] for d in data)),
+            ('copies', encode_ints(d['available_copies'] for d in data)),
+            ('titleord', encode_ints(title_order)),
+            ('yearord', encode_ints(year_order)),
+            ('ft_term', encode_strings(terms)),
+            ('ft_off', encode_ints(offsets)),
+            ('ft_row', encode_ints(rows)),
+            ('ft_tf', encode_ints(freqs)),
+            ('ft_len', encode_ints(text_index.doc_len[isbn] for isbn, _ in books)),
+            ('mem_id', encode_strings(member_id for member_id, _, _ in members)),
+            ('mem_name', encode_strings(name for _, name, _ in members)),
+            ('mem_loan', encode_strings(";".join(loans) for _, _, loans in members)),
+        ])
+        self.metrics.observe_save('snapshot', time.perf_counter() - start,
+                                  os.path.getsize(filepath))
+
+    def load_snapshot(self, filepath):
+        """
+        Load catalog and members from a binary snapshot into an empty
+        system. Every section is verified first, then the tree and indexes
+        are rebuilt from the decoded columns; only the full-text postings
+        stay packed until queried. Returns load statistics.
+        """
+        with self.lock:
+            start = time.perf_counter()
+            with SnapshotReader(filepath) as reader:
+                # Fail before touching any state if the file is damaged
+                reader.verify(SNAPSHOT_SECTIONS)
+                isbns = reader.strings('isbn').to_list()
+                titles = reader.strings('title').to_list()
+                authors = reader.strings('author').to_list()
+                categories = reader.strings('category').to_list()
+                years = reader.ints('year')
+                copies = reader.ints('copies')
+                items = [(isbns[i], BookRecord(titles[i], authors[i], years[i],
+                                               categories[i], copies[i]))
+                         for i in range(len(isbns))]
+                self._build_catalog(items, reader.ints('titleord'), reader.ints('yearord'),
+                                    text_index=False)
+                self.text_index.restore(isbns, reader.ints('ft_len'),
+                                        reader.strings('ft_term').to_list(),
+                                        reader.ints('ft_off'), reader.ints('ft_row'),
+                                        reader.ints('ft_tf'))
+
+                member_ids = reader.strings('mem_id').to_list()
+                names = reader.strings('mem_name').to_list()
+                loans = reader.strings('mem_loan').to_list()
+                for member_id, name, loan in zip(member_ids, names, loans):
+                    self.members.add_member(member_id, name)
+                    if loan:
+                        self.members.set_loans(member_id, loan.split(";"))
+
+            self.version += 1
+            self.last_load_stats = {
+                'rows': len(items),
+                'books': self.books.size,
+                'source': 'snapshot',
+                'seconds': time.perf_counter() - start,
+            }
+            return self.last_load_stats
+
+    # --------------------
+    # Index statistics
+    # --------------------
+    def index_stats(self):
+        """Chain-length statistics for each hash-backed index."""
+        indexes = (('members', self.members), ('titles', self.title_index),
+                   ('authors', self.author_index))
+        # Backend-served indexes (SQLiteStorage cache=False) have no table
+        return {name: index.table.chain_stats() for name, index in indexes
+                if index.table is not None}
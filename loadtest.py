@@ -0,0 +1,327 @@
+# =========================
+# HTTP workload generator / replayer with latency percentiles
+#
+#   python loadtest.py                          # in-process, default mix
+#   python loadtest.py --synthetic 100000 -c 8 -n 20000
+#   python loadtest.py --url http://localhost:5000 --duration 30
+#   python loadtest.py --mix browse=1,borrow=5 --record run.jsonl
+#   python loadtest.py --replay run.jsonl
+#
+# In-process mode runs app.py through the Flask test client inside a
+# temporary copy of the data, so the real CSVs and journal are untouched.
+# =========================
+
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_MIX = {
+    'browse': 2,          # GET /api/books/all
+    'browse_page': 4,     # GET /api/books/all?offset=&limit=
+    'search_isbn': 6,
+    'search_title': 6,
+    'search_author': 6,
+    'search_keyword': 4,
+    'member_lookup': 4,   # GET /api/members/<id>
+    'members_page': 2,    # GET /api/members/all?offset=&limit=
+    'borrow_return': 4,   # POST borrow, then POST return on success
+}
+
+
+# ---------------------
+# Clients
+# ---------------------
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        data = response.get_json(silent=True)
+        return response.status_code, data
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+
+# ---------------------
+# Workload
+# ---------------------
+class Workload:
+    """Turns an operation mix into concrete requests using live sample data."""
+    def __init__(self, client, mix):
+        self.mix = [(op, weight) for op, weight in mix.items() if weight > 0]
+        status, page = client.request('GET', '/api/books/all?offset=0&limit=500')
+        self.books = page['books'] if status == 200 else []
+        status, page = client.request('GET', '/api/members/all?offset=0&limit=500')
+        self.members = [m['member_id'] for m in page['members']] if status == 200 else []
+        self.total_books = len(self.books)
+        if not self.books or not self.members:
+            raise SystemExit("Workload needs at least one book and one member")
+
+    def next_op(self, rng):
+        ops, weights = zip(*self.mix)
+        return rng.choices(ops, weights)[0]
+
+    def requests_for(self, op, rng):
+        """List of (name, method, path, body); borrow_return is two steps."""
+        book = rng.choice(self.books)
+        if op == 'browse':
+            return [(op, 'GET', '/api/books/all', None)]
+        if op == 'browse_page':
+            offset = rng.randrange(0, max(self.total_books, 1))
+            return [(op, 'GET', f'/api/books/all?offset={offset}&limit=20', None)]
+        if op in ('search_isbn', 'search_title', 'search_author'):
+            kind = op.split('_')[1]
+            return [(op, 'POST', '/api/books/search',
+                     {'type': kind, 'query': book[kind]})]
+        if op == 'search_keyword':
+            words = book['title'].split()
+            return [(op, 'POST', '/api/books/search',
+                     {'type': 'keyword', 'query': " ".join(rng.sample(words, min(2, len(words))))})]
+        if op == 'member_lookup':
+            return [(op, 'GET', f'/api/members/{rng.choice(self.members)}', None)]
+        if op == 'members_page':
+            return [(op, 'GET', f'/api/members/all?offset={rng.randrange(len(self.members))}&limit=20', None)]
+        if op == 'borrow_return':
+            body = {'member_id': rng.choice(self.members), 'isbn': book['isbn']}
+            return [('borrow', 'POST', '/api/books/borrow', body),
+                    ('return', 'POST', '/api/books/return', body)]
+        raise ValueError(f"unknown operation {op!r}")
+
+
+# ---------------------
+# Runner
+# ---------------------
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, name, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already-sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(int(round(p / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(k, len(sorted_values) - 1)]
+
+
+def run(make_client, plan, workload, concurrency, total, duration, seed, recorder=None):
+    """
+    plan: list of requests to replay, or None to generate from workload.
+    Stops after `total` operations or `duration` seconds, whichever first.
+    """
+    stats = Stats()
+    counter = {'next': 0}
+    counter_lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def claim():
+        with counter_lock:
+            i = counter['next']
+            limit = len(plan) if plan is not None else total
+            if (limit is not None and i >= limit) or (deadline and time.perf_counter() > deadline):
+                return None
+            counter['next'] = i + 1
+            return i
+
+    def worker(worker_id):
+        client = make_client()
+        rng = random.Random(seed + worker_id)
+        while True:
+            i = claim()
+            if i is None:
+                return
+            steps = [plan[i]] if plan is not None else \
+                workload.requests_for(workload.next_op(rng), rng)
+            for name, method, path, body in steps:
+                if recorder:
+                    recorder.write(name, method, path, body)
+                start = time.perf_counter()
+                status, data = client.request(method, path, body)
+                ok = status < 400
+                stats.add(name, time.perf_counter() - start, ok)
+                # Only return what was actually borrowed
+                if name == 'borrow' and not (data or {}).get('success'):
+                    break
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - start
+
+
+class Recorder:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write(self, name, method, path, body):
+        line = json.dumps({'name': name, 'method': method, 'path': path, 'body': body})
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def load_replay(path):
+    with open(path, encoding='utf-8') as file:
+        return [(r['name'], r['method'], r['path'], r.get('body'))
+                for r in map(json.loads, file) if r]
+
+
+def report(stats, elapsed):
+    rows = []
+    total = 0
+    for name in sorted(stats.latencies):
+        values = sorted(stats.latencies[name])
+        total += len(values)
+        rows.append({
+            'endpoint': name,
+            'count': len(values),
+            'errors': stats.errors.get(name, 0),
+            'throughput': len(values) / elapsed,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+            'max_ms': values[-1] * 1000,
+        })
+    print(f"\n{'endpoint':<16}{'count':>8}{'err':>6}{'req/s':>10}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for r in rows:
+        print(f"{r['endpoint']:<16}{r['count']:>8}{r['errors']:>6}{r['throughput']:>10.1f}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}")
+    print(f"\n{total} requests in {elapsed:.2f} s = {total / elapsed:.1f} req/s")
+    return {'elapsed': elapsed, 'requests': total, 'endpoints': rows}
+
+
+# ---------------------
+# Setup
+# ---------------------
+def prepare_data_dir(synthetic, seed):
+    """Temp dir with either a copy of the CSVs or a synthetic data set."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.mkdtemp(prefix="library-loadtest-")
+    if synthetic:
+        from bench import generate_catalog, generate_members
+        with open(os.path.join(tmp, "books.csv"), 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["ISBN", "Title", "Author", "Year", "Category", "TotalCopies"])
+            writer.writerows(sorted(generate_catalog(synthetic, seed)))
+        with open(os.path.join(tmp, "members.csv"), 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(["MemberID", "Name", "BorrowedBooks"])
+            writer.writerows((m, name, "") for m, name in
+                             generate_members(max(synthetic // 10, 1)))
+    else:
+        for name in ("books.csv", "members.csv"):
+            if os.path.exists(os.path.join(here, name)):
+                shutil.copy(os.path.join(here, name), tmp)
+    return tmp
+
+
+def parse_mix(text):
+    mix = dict.fromkeys(DEFAULT_MIX, 0)
+    for part in text.split(','):
+        op, _, weight = part.partition('=')
+        if op.strip() not in DEFAULT_MIX:
+            raise SystemExit(f"unknown operation {op!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[op.strip()] = float(weight or 1)
+    return mix
+
+
+def run_workload(args, make_client):
+    plan = load_replay(args.replay) if args.replay else None
+    workload = None if plan else Workload(make_client(), parse_mix(args.mix) if args.mix
+                                          else DEFAULT_MIX)
+    recorder = Recorder(args.record) if args.record else None
+    total = None if args.duration and not plan else args.requests
+    try:
+        return run(make_client, plan, workload, args.concurrency, total,
+                   args.duration, args.seed, recorder)
+    finally:
+        if recorder:
+            recorder.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the library API and report latency percentiles")
+    parser.add_argument('--url', help="target a running server instead of the in-process app")
+    parser.add_argument('-c', '--concurrency', type=int, default=4)
+    parser.add_argument('-n', '--requests', type=int, default=5000, help="operations to issue")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('--mix', help="e.g. browse=1,search_title=5,borrow_return=2")
+    parser.add_argument('--synthetic', type=int, help="in-process only: generate N books")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--record', help="write the generated requests as JSON lines")
+    parser.add_argument('--replay', help="replay a recorded JSON-lines workload")
+    parser.add_argument('-o', '--output', help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    # The in-process app runs inside its data directory
+    for name in ('record', 'replay', 'output'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        stats, elapsed = run_workload(args, make_client)
+    else:
+        cwd = os.getcwd()
+        data_dir = prepare_data_dir(args.synthetic, args.seed)
+        try:
+            os.chdir(data_dir)
+            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+            import app as app_module
+            print(f"In-process app on data in {data_dir}")
+            try:
+                stats, elapsed = run_workload(args, lambda: InProcessClient(app_module.app))
+            finally:
+                app_module.lib.close()
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    result = report(stats, elapsed)
+    if args.output:
+        result['concurrency'] = args.concurrency
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(result, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,9 @@
 from library_system import LibrarySystem
+from storage import default_storage
+from importer import print_progress
+import argparse
+import json
+import sys
 
 def print_menu():
     print("\n===== UET Library Management System =====")
@@ -12,15 +17,60 @@ def print_menu():
     print("8. Return book")
     print("9. List all books")
     print("10. Show member info")
+    print("11. Import catalog CSV (parallel)")
+    print("12. Remove book")
+    print("13. Run batch file")
     print("0. Exit")
 
 
+def load_library():
+    lib = LibrarySystem(default_storage())
+    lib.load()
+    return lib
+
+
+# --------------------
+# Batch files: one JSON operation per line, e.g.
+#   {"op": "return", "member_id": "M001", "isbn": "978..."}
+# (ops: borrow, return, add_book, add_member)
+# --------------------
+def read_batch_file(path):
+    operations = []
+    with open(path, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                operations.append(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"line {line_no}: {e}")
+    return operations
+
+
+def run_batch_file(lib, path, atomic=False):
+    """Apply a batch file and report failures; returns True if all succeeded."""
+    try:
+        operations = read_batch_file(path)
+    except (OSError, ValueError) as e:
+        print(f"Batch failed: {e}")
+        return False
+    outcome = lib.apply_batch(operations, atomic)
+    if not outcome['committed']:
+        failure = outcome['results'][outcome['aborted_at']]
+        print(f"  #{failure['index'] + 1} {failure['op']}: {failure['message']}")
+        print(f"Batch rolled back; nothing applied ({len(operations)} operations).")
+    else:
+        for result in outcome['results']:
+            if not result['success']:
+                print(f"  #{result['index'] + 1} {result['op']}: {result['message']}")
+        print(f"{outcome['applied']} of {len(operations)} operations applied, "
+              f"{outcome['failed']} failed.")
+    return outcome['failed'] == 0
+
+
 def main():
-    lib = LibrarySystem()
-    
     # Load books and members at startup
-    lib.load_books_from_csv("books.csv")
-    lib.load_members_from_csv("members.csv")
+    lib = load_library()
     print("Books and members loaded successfully.")
 
     while True:
@@ -31,8 +81,9 @@ def main():
         # Books
         # --------------------
         if choice == "1":
-            lib.load_books_from_csv("books.csv")
-            lib.load_members_from_csv("members.csv")
+            # Reload from scratch so journal replay is not applied twice
+            lib.close()
+            lib = load_library()
             print("Books and members loaded successfully.")
 
         elif choice == "2":
@@ -44,8 +95,7 @@ def main():
             copies = int(input("Copies: ").strip())
 
             if lib.add_book(ISBN, title, author, year, category, copies):
-                lib.save_books()
-                print("Book added and saved to CSV.")
+                print("Book added and saved.")
             else:
                 print("Book already exists.")
 
@@ -75,7 +125,7 @@ def main():
             member_id = input("Member ID: ").strip()
             name = input("Name: ").strip()
             if lib.add_member(member_id, name):
-                lib.save_members()
+                lib.persist()
                 print("Member added.")
             else:
                 print("Member already exists.")
@@ -84,8 +134,7 @@ def main():
             member_id = input("Member ID: ").strip()
             ISBN = input("ISBN: ").strip()
             if lib.borrow_book(member_id, ISBN):
-                lib.save_books()
-                lib.save_members()
+                lib.persist()
                 print("Book borrowed.")
             else:
                 print("Borrow failed.")
@@ -94,8 +143,7 @@ def main():
             member_id = input("Member ID: ").strip()
             ISBN = input("ISBN: ").strip()
             if lib.return_book(member_id, ISBN):
-                lib.save_books()
-                lib.save_members()
+                lib.persist()
                 print("Book returned.")
             else:
                 print("Return failed.")
@@ -124,7 +172,35 @@ def main():
             else:
                 print("Member not found.")
 
+        elif choice == "11":
+            path = input("CSV file: ").strip()
+            try:
+                stats = lib.import_books(path, progress=print_progress,
+                                         errors_path="rejected_rows.csv")
+            except (OSError, ValueError) as e:
+                print(f"Import failed: {e}")
+            else:
+                print(f"\n{stats['imported']} books imported, {stats['existing']} already present, "
+                      f"{stats['duplicates']} duplicate rows, {stats['rejected']} rejected")
+                if stats['rejected']:
+                    print("Rejected rows written to rejected_rows.csv")
+
+        elif choice == "12":
+            ISBN = input("ISBN: ").strip()
+            if lib.remove_book(ISBN):
+                print("Book removed.")
+            elif lib.search_by_isbn(ISBN):
+                print("Book is on loan; return all copies first.")
+            else:
+                print("Book not found.")
+
+        elif choice == "13":
+            path = input("Batch file: ").strip()
+            atomic = input("All or nothing? (y/n): ").strip().lower() == "y"
+            run_batch_file(lib, path, atomic)
+
         elif choice == "0":
+            lib.close()
             print("Exiting system.")
             break
 
@@ -133,4 +209,17 @@ def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UET Library Management System")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="apply a batch file of transactions and exit")
+    parser.add_argument('--atomic', action='store_true',
+                        help="with --batch: apply all operations or none")
+    args = parser.parse_args()
+    if args.batch:
+        lib = load_library()
+        try:
+            ok = run_batch_file(lib, args.batch, args.atomic)
+        finally:
+            lib.close()
+        sys.exit(0 if ok else 1)
     main()
@@ -0,0 +1,160 @@
+# =========================
+# Runtime Metrics
+# Counters and fixed-bucket histograms, rendered in the Prometheus text
+# exposition format. Recording is a lock, a bisect and two increments,
+# so it stays on in production.
+# =========================
+
+from avl import AVLTree
+from bisect import bisect_left
+import threading
+
+# Upper bounds in seconds (the +Inf bucket is implicit)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def copy(self):
+        copy = Histogram(self.buckets)
+        copy.counts = list(self.counts)
+        copy.sum = self.sum
+        copy.count = self.count
+        return copy
+
+    def cumulative(self):
+        """(upper bound label, cumulative count) pairs ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets + (None,), self.counts):
+            total += count
+            yield ("+Inf" if bound is None else repr(bound)), total
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}        # (method, route, status) -> count
+        self.latency = {}         # route -> Histogram
+        self.saves = {}           # file -> Histogram of save durations
+        self.saved_bytes = {}     # file -> total bytes written
+        self.last_save_bytes = {}
+
+    def observe_request(self, method, route, status, seconds):
+        key = (method, route, status)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.get(route)
+            if histogram is None:
+                histogram = self.latency[route] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_save(self, name, seconds, size):
+        with self.lock:
+            histogram = self.saves.get(name)
+            if histogram is None:
+                histogram = self.saves[name] = Histogram()
+            histogram.observe(seconds)
+            self.saved_bytes[name] = self.saved_bytes.get(name, 0) + size
+            self.last_save_bytes[name] = size
+
+
+# ---------------------
+# Text exposition
+# ---------------------
+def _labels(**labels):
+    if not labels:
+        return ""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name, kind, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, value, **labels):
+        self.lines.append(f"{name}{_labels(**labels)} {value}")
+
+    def histogram(self, name, histogram, **labels):
+        for bound, count in histogram.cumulative():
+            self.sample(f"{name}_bucket", count, le=bound, **labels)
+        self.sample(f"{name}_sum", repr(histogram.sum), **labels)
+        self.sample(f"{name}_count", histogram.count, **labels)
+
+    def text(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render(metrics, lib):
+    """Prometheus text for the recorded metrics plus live structure stats."""
+    out = _Writer()
+    with metrics.lock:
+        requests = sorted(metrics.requests.items())
+        latency = sorted((route, h.copy()) for route, h in metrics.latency.items())
+        saves = sorted((name, h.copy()) for name, h in metrics.saves.items())
+        saved_bytes = dict(metrics.saved_bytes)
+        last_save_bytes = dict(metrics.last_save_bytes)
+
+    out.header("library_http_requests_total", "counter", "HTTP requests by route and status.")
+    for (method, route, status), count in requests:
+        out.sample("library_http_requests_total", count, method=method, route=route, status=status)
+    out.header("library_http_request_duration_seconds", "histogram", "HTTP request latency.")
+    for route, histogram in latency:
+        out.histogram("library_http_request_duration_seconds", histogram, route=route)
+
+    out.header("library_csv_save_duration_seconds", "histogram", "Time to rewrite a data file (CSV or binary snapshot).")
+    for name, histogram in saves:
+        out.histogram("library_csv_save_duration_seconds", histogram, file=name)
+    out.header("library_csv_save_bytes_total", "counter", "Bytes written by CSV and snapshot saves.")
+    for name in sorted(saved_bytes):
+        out.sample("library_csv_save_bytes_total", saved_bytes[name], file=name)
+    out.header("library_csv_last_save_bytes", "gauge", "Size of the most recent CSV or snapshot save.")
+    for name in sorted(last_save_bytes):
+        out.sample("library_csv_last_save_bytes", last_save_bytes[name], file=name)
+
+    # Read without lib.lock: the values are plain ints, a scrape may be
+    # one mutation behind
+    tree = lib.books
+    out.header("library_avl_size", "gauge", "Books in the AVL tree.")
+    out.sample("library_avl_size", tree.size)
+    if isinstance(tree, AVLTree):  # not when SQLite serves the catalog
+        out.header("library_avl_height", "gauge", "Height of the AVL tree (empty = -1).")
+        out.sample("library_avl_height", tree.height(tree.root))
+        out.header("library_avl_rotations_total", "counter", "AVL rebalancing rotations.")
+        out.sample("library_avl_rotations_total", tree.right_rotations, direction="right")
+        out.sample("library_avl_rotations_total", tree.left_rotations, direction="left")
+    out.header("library_members", "gauge", "Registered members.")
+    out.sample("library_members", len(lib.members))
+    out.header("library_data_version", "counter", "Successful mutations since start.")
+    out.sample("library_data_version", lib.version)
+
+    stats = lib.index_stats()
+    for key, kind, help_text in (
+            ('buckets', 'gauge', "Hash table bucket count."),
+            ('entries', 'gauge', "Hash table entries."),
+            ('load_factor', 'gauge', "Entries per bucket."),
+            ('max_chain', 'gauge', "Longest bucket chain."),
+            ('mean_chain', 'gauge', "Mean length of non-empty chains.")):
+        name = f"library_hash_{key}"
+        out.header(name, kind, help_text)
+        for index in sorted(stats):
+            out.sample(name, stats[index][key], index=index)
+    return out.text()
@@ -0,0 +1,195 @@
+# =========================
+# Binary Snapshot Format
+#
+# header   : magic(8) version(u16) sections(u16)
+# sections : name(8) offset(u64) length(u64) crc32(u32)   × sections
+# payload  : one column per section, 8-byte aligned, little-endian
+#
+# string column : count(u32) offsets(u32 × count+1) utf-8 blob,
+#                 values separated by NUL (bulk decode = one split)
+# int column    : int32 × count
+# =========================
+
+from array import array
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+MAGIC = b"LIBSNAP\0"
+FORMAT_VERSION = 2  # 2: Unicode full-text terms
+HEADER = struct.Struct("<8sHH")
+ENTRY = struct.Struct("<8sQQI")
+COUNT = struct.Struct("<I")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _little_endian(arr):
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+def encode_strings(values):
+    values = list(values)
+    offsets = array('I', [0])
+    parts = []
+    total = 0
+    for value in values:
+        data = value.encode('utf-8')
+        parts.append(data)
+        total += len(data) + 1
+        offsets.append(total)
+    return (COUNT.pack(len(values)) + _little_endian(offsets).tobytes()
+            + b"\0".join(parts))
+
+
+def encode_ints(values):
+    return _little_endian(array('i', values)).tobytes()
+
+
+# ---------------------
+# Writer
+# ---------------------
+def write_snapshot(path, sections):
+    """
+    sections: list of (name, bytes). Written to a temp file and renamed
+    into place, so a crash never leaves a half-written snapshot.
+    """
+    table_size = HEADER.size + ENTRY.size * len(sections)
+    offset = (table_size + 7) & ~7
+    entries = []
+    for name, data in sections:
+        entries.append((name.encode('ascii'), offset, len(data), zlib.crc32(data)))
+        offset = (offset + len(data) + 7) & ~7
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        for entry in entries:
+            file.write(ENTRY.pack(*entry))
+        for (_, data), (_, start, _, _) in zip(sections, entries):
+            file.write(b"\0" * (start - file.tell()))
+            file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+# ---------------------
+# Reader
+# ---------------------
+class StringColumn:
+    """Random access decodes one value straight from the mapped bytes."""
+    def __init__(self, buf):
+        self.buf = buf
+        self.count = COUNT.unpack_from(buf, 0)[0]
+        end = COUNT.size + 4 * (self.count + 1)
+        if sys.byteorder == 'little':
+            self.offsets = buf[COUNT.size:end].cast('I')
+        else:
+            self.offsets = _little_endian(array('I', bytes(buf[COUNT.size:end])))
+        self.blob = buf[end:]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1] - 1], 'utf-8')
+
+    def to_list(self):
+        if not self.count:
+            return []
+        return str(self.blob, 'utf-8').split("\0")
+
+    def release(self):
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        self.blob.release()
+        self.buf.release()
+
+
+class SnapshotReader:
+    """
+    Maps the file and decodes/verifies each section only on first access.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise SnapshotError("empty snapshot file")
+        self.view = memoryview(self.map)
+        self.columns = {}
+        self.verified = set()
+
+        try:
+            magic, version, count = HEADER.unpack_from(self.view, 0)
+        except struct.error:
+            self.close()
+            raise SnapshotError("truncated snapshot header")
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError("not a library snapshot")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise SnapshotError(f"unsupported snapshot version {version}")
+        self.sections = {}
+        try:
+            for i in range(count):
+                name, offset, length, crc = ENTRY.unpack_from(self.view, HEADER.size + i * ENTRY.size)
+                if offset + length > len(self.view):
+                    raise struct.error("section past end of file")
+                self.sections[name.rstrip(b"\0").decode('ascii')] = (offset, length, crc)
+        except struct.error:
+            self.close()
+            raise SnapshotError("truncated snapshot section table")
+
+    def verify(self, names=None):
+        """Check section checksums up front (all sections by default)."""
+        for name in names or self.sections:
+            self._section(name).release()
+
+    def _section(self, name):
+        if name not in self.sections:
+            raise SnapshotError(f"missing section {name!r}")
+        offset, length, crc = self.sections[name]
+        buf = self.view[offset:offset + length]
+        if name not in self.verified:
+            if zlib.crc32(buf) != crc:
+                buf.release()
+                raise SnapshotError(f"checksum mismatch in section {name!r}")
+            self.verified.add(name)
+        return buf
+
+    def strings(self, name):
+        if name not in self.columns:
+            self.columns[name] = StringColumn(self._section(name))
+        return self.columns[name]
+
+    def ints(self, name):
+        if name not in self.columns:
+            buf = self._section(name)
+            self.columns[name] = _little_endian(array('i', buf.tobytes()))
+            buf.release()
+        return self.columns[name]
+
+    def close(self):
+        for column in self.columns.values():
+            if isinstance(column, StringColumn):
+                column.release()
+        self.columns = {}
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
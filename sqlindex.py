@@ -0,0 +1,360 @@
+# =========================
+# SQLite-backed catalog and indexes
+# With SQLiteStorage(cache=False) the books, members and loans stay in
+# the database. These classes stand in for LibrarySystem's AVL tree, hash
+# tables and sorted arrays and answer every lookup with an indexed query,
+# so memory no longer grows with the catalog. SQLiteStorage writes each
+# change before LibrarySystem applies it in memory, so the mutators here
+# have nothing left to do.
+# =========================
+
+from avl import BookRecord
+from hashes import MemberNode, FullTextIndex
+
+# Rows per query in the ordered walks: each chunk is a fresh query that
+# resumes after the last key, so no read transaction is left open
+WALK_CHUNK = 500
+# Host parameters per IN (...) list
+IN_CHUNK = 500
+BOOK_FIELDS = "isbn, title, author, year, category, available_copies"
+
+
+def book_item(row):
+    """(isbn, BookRecord) from a BOOK_FIELDS row."""
+    isbn, title, author, year, category, copies = row
+    return isbn, BookRecord(title, author, year, category, copies)
+
+
+def placeholders(n):
+    return ",".join("?" * n)
+
+
+class SQLBookNode:
+    """The part of a tree node callers read: key and record."""
+    __slots__ = ('key', 'value')
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+# ---------------------
+# Catalog (AVLTree)
+# ---------------------
+class SQLBooks:
+    persistent = True
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def _query(self, sql, params=()):
+        return self.storage.reader().execute(sql, params).fetchall()
+
+    @property
+    def size(self):
+        return self._query("SELECT COUNT(*) FROM books")[0][0]
+
+    @property
+    def root(self):
+        # Only ever compared with None (is the catalog empty?)
+        rows = self._query("SELECT 1 FROM books LIMIT 1")
+        return rows[0] if rows else None
+
+    def snapshot(self):
+        # No frozen view: a long walk sees later changes, but still
+        # yields each ISBN at most once and in order (see iter_inorder)
+        return self
+
+    def search(self, ISBN):
+        rows = self._query(f"SELECT {BOOK_FIELDS} FROM books WHERE isbn = ?", (ISBN,))
+        return SQLBookNode(*book_item(rows[0])) if rows else None
+
+    def search_many(self, ISBNs):
+        keys = sorted(set(ISBNs))
+        found = {}
+        for i in range(0, len(keys), IN_CHUNK):
+            chunk = keys[i:i + IN_CHUNK]
+            for row in self._query(f"SELECT {BOOK_FIELDS} FROM books "
+                                   f"WHERE isbn IN ({placeholders(len(chunk))})", chunk):
+                isbn, data = book_item(row)
+                found[isbn] = SQLBookNode(isbn, data)
+        return found
+
+    def rank(self, ISBN):
+        return self._query("SELECT COUNT(*) FROM books WHERE isbn < ?", (ISBN,))[0][0]
+
+    def page(self, offset, limit):
+        return [book_item(row) for row in self._query(
+            f"SELECT {BOOK_FIELDS} FROM books ORDER BY isbn LIMIT ? OFFSET ?", (limit, offset))]
+
+    def page_after(self, ISBN, limit):
+        return [book_item(row) for row in self._query(
+            f"SELECT {BOOK_FIELDS} FROM books WHERE isbn > ? ORDER BY isbn LIMIT ?",
+            (ISBN, limit))]
+
+    def iter_inorder(self, after=None):
+        """Yield (ISBN, record) in key order, WALK_CHUNK rows per query."""
+        while True:
+            rows = self.page(0, WALK_CHUNK) if after is None else self.page_after(after, WALK_CHUNK)
+            yield from rows
+            if len(rows) < WALK_CHUNK:
+                return
+            after = rows[-1][0]
+
+    def inorder(self):
+        return list(self.iter_inorder())
+
+    # Already written by SQLiteStorage
+    def insert(self, ISBN, value):
+        pass
+
+    def update(self, ISBN, value):
+        pass
+
+    def delete(self, ISBN):
+        pass
+
+    def build_sorted(self, items):
+        pass
+
+
+# ---------------------
+# Members and loans (MemberDatabase)
+# ---------------------
+class SQLMembers:
+    table = None  # no hash table for index_stats()
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __len__(self):
+        return self.storage.reader().execute("SELECT COUNT(*) FROM members").fetchone()[0]
+
+    def _nodes(self, sql, params):
+        """(member_id, MemberNode) pairs for the query's rows, loans filled in."""
+        conn = self.storage.reader()
+        pairs = [(member_id, MemberNode(member_id, name))
+                 for member_id, name in conn.execute(sql, params).fetchall()]
+        by_id = dict(pairs)
+        ids = list(by_id)
+        for i in range(0, len(ids), IN_CHUNK):
+            chunk = ids[i:i + IN_CHUNK]
+            for member_id, isbn in conn.execute(
+                    f"SELECT member_id, isbn FROM loans WHERE member_id IN "
+                    f"({placeholders(len(chunk))}) ORDER BY id", chunk).fetchall():
+                member = by_id[member_id]
+                member.borrowed_books.append(isbn)
+                member.loan_counts[isbn] = member.loan_counts.get(isbn, 0) + 1
+        return pairs
+
+    def get_member(self, member_id):
+        pairs = self._nodes("SELECT member_id, name FROM members WHERE member_id = ?",
+                            (member_id,))
+        return pairs[0][1] if pairs else None
+
+    def page(self, offset, limit):
+        return self._nodes("SELECT member_id, name FROM members ORDER BY member_id "
+                           "LIMIT ? OFFSET ?", (limit, offset))
+
+    def page_after(self, member_id, limit):
+        return self._nodes("SELECT member_id, name FROM members WHERE member_id > ? "
+                           "ORDER BY member_id LIMIT ?", (member_id, limit))
+
+    def iter_sorted(self, after=None):
+        while True:
+            pairs = self.page(0, WALK_CHUNK) if after is None else self.page_after(after, WALK_CHUNK)
+            yield from pairs
+            if len(pairs) < WALK_CHUNK:
+                return
+            after = pairs[-1][0]
+
+    def table_items(self):
+        return self.iter_sorted()
+
+    def holders(self, isbn):
+        """(member_id, copies) pairs for an ISBN, in member-ID order."""
+        return self.storage.reader().execute(
+            "SELECT member_id, COUNT(*) FROM loans WHERE isbn = ? "
+            "GROUP BY member_id ORDER BY member_id", (isbn,)).fetchall()
+
+    # Already written by SQLiteStorage
+    def add_member(self, member_id, name):
+        pass
+
+    def remove_member(self, member_id):
+        pass
+
+    def borrow_book(self, member_id, isbn):
+        pass
+
+    def return_book(self, member_id, isbn):
+        pass
+
+    def add_loan(self, member_id, isbn):
+        pass
+
+    def set_loans(self, member_id, isbns):
+        pass
+
+
+# ---------------------
+# Title / author lookups (TitleIndex, AuthorIndex)
+# ---------------------
+class SQLNameIndex:
+    """Normalized title or author → ISBNs, newest first, from its column index."""
+    table = None  # no hash table for index_stats()
+    fuzzy = None  # no trigram index: fuzzy lookups find nothing
+
+    def __init__(self, storage, column):
+        self.storage = storage
+        self.column = column  # 'title_norm' or 'author_norm'
+        self.normalize = storage.normalize
+
+    def get_books_list(self, key):
+        return [isbn for isbn, in self.storage.reader().execute(
+            f"SELECT isbn FROM books WHERE {self.column} = ? ORDER BY rowid DESC",
+            (self.normalize(key),)).fetchall()]
+
+    def get_isbn(self, key):
+        """The most recently added book with this key, or None."""
+        row = self.storage.reader().execute(
+            f"SELECT isbn FROM books WHERE {self.column} = ? ORDER BY rowid DESC LIMIT 1",
+            (self.normalize(key),)).fetchone()
+        return row[0] if row else None
+
+    def complete(self, prefix, limit=10):
+        """Up to limit (normalized key, isbn) pairs starting with prefix."""
+        prefix = self.normalize(prefix)
+        if not prefix:
+            return []
+        return self.storage.reader().execute(
+            f"SELECT {self.column}, isbn FROM books WHERE {self.column} >= ? AND "
+            f"{self.column} < ? ORDER BY {self.column} LIMIT ?",
+            (prefix, prefix + "\U0010ffff", limit)).fetchall()
+
+    def build_fuzzy(self):
+        pass
+
+    def fuzzy_search(self, key, limit=10):
+        return []
+
+    # Already written by SQLiteStorage
+    def add_book(self, key, isbn):
+        pass
+
+    def bulk_add(self, pairs):
+        pass
+
+    def remove_book(self, key, isbn):
+        pass
+
+
+# ---------------------
+# Keyword search (FullTextIndex)
+# ---------------------
+class SQLTextIndex:
+    """
+    BM25 keyword search over the books_text FTS5 table. Its unicode61
+    tokenizer splits, case-folds and strips accents like FullTextIndex;
+    query terms are tokenized by FullTextIndex itself and all must match.
+    """
+    def __init__(self, storage):
+        self.storage = storage
+        self.tokenize = FullTextIndex().tokenize
+
+    def search(self, query, k=10):
+        """Top-k (score, isbn) pairs for documents matching all query terms."""
+        terms = list(dict.fromkeys(self.tokenize(query)))
+        if not terms:
+            return []
+        match = " ".join('"%s"' % term.replace('"', '""') for term in terms)
+        return [(-rank, isbn) for rank, isbn in self.storage.reader().execute(
+            "SELECT bm25(books_text) AS rank, books.isbn FROM books_text "
+            "JOIN books ON books.rowid = books_text.rowid "
+            "WHERE books_text MATCH ? ORDER BY rank LIMIT ?", (match, k)).fetchall()]
+
+    # Kept current by the books_text triggers
+    def add_book(self, isbn, title, author, category):
+        pass
+
+    def bulk_add(self, items):
+        pass
+
+    def remove_book(self, isbn, title, author, category):
+        pass
+
+
+# ---------------------
+# Faceted browse (CategoryIndex, YearIndex)
+# ---------------------
+class SQLYearIndex:
+    """(year, isbn) pairs, oldest first, optionally within one category."""
+    def __init__(self, storage, category=None):
+        self.storage = storage
+        self.category = category
+
+    def range(self, year_from=None, year_to=None):
+        """Yield (year, isbn) with year_from <= year <= year_to, WALK_CHUNK rows per query."""
+        where, params = [], []
+        if self.category is not None:
+            where.append("category = ? COLLATE NOCASE")
+            params.append(self.category)
+        if year_from is not None:
+            where.append("year >= ?")
+            params.append(year_from)
+        if year_to is not None:
+            where.append("year <= ?")
+            params.append(year_to)
+        last = None
+        while True:
+            clauses = where if last is None else where + ["(year, isbn) > (?, ?)"]
+            rows = self.storage.reader().execute(
+                "SELECT year, isbn FROM books" +
+                (" WHERE " + " AND ".join(clauses) if clauses else "") +
+                " ORDER BY year, isbn LIMIT ?",
+                params + list(last or ()) + [WALK_CHUNK]).fetchall()
+            yield from rows
+            if len(rows) < WALK_CHUNK:
+                return
+            last = rows[-1]
+
+    # Already written by SQLiteStorage
+    def add(self, year, isbn):
+        pass
+
+    def bulk_add(self, pairs):
+        pass
+
+    def remove(self, year, isbn):
+        pass
+
+
+class SQLCategoryIndex:
+    table = None  # no hash table for index_stats()
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def get(self, category):
+        category = category.strip()
+        if not self.storage.reader().execute(
+                "SELECT 1 FROM books WHERE category = ? COLLATE NOCASE LIMIT 1",
+                (category,)).fetchone():
+            return None
+        return SQLYearIndex(self.storage, category)
+
+    def categories(self):
+        """(category name, number of books) for every non-empty category."""
+        return sorted(self.storage.reader().execute(
+            "SELECT MIN(category), COUNT(*) FROM books "
+            "GROUP BY category COLLATE NOCASE").fetchall())
+
+    # Already written by SQLiteStorage
+    def add_book(self, category, year, isbn):
+        pass
+
+    def bulk_add(self, triples):
+        pass
+
+    def remove_book(self, category, year, isbn):
+        pass
@@ -124,6 +124,60 @@ function debounce(func, wait) {
     };
 }
 
+// =========================
+// Live Updates (change feed)
+// =========================
+// reload() refetches everything; the server asks for it on first connect
+// and when this page has fallen too far behind. Changes arriving while it
+// runs are applied afterwards (they carry absolute values, so a change
+// already reflected in the fresh data is harmless).
+function subscribeChanges(onChange, reload) {
+    if (!window.EventSource) {
+        reload();
+        return null;
+    }
+    let queued = null;
+    const source = new EventSource('/api/changes/stream');
+    source.addEventListener('resync', async () => {
+        queued = [];
+        try {
+            await reload();
+        } finally {
+            const changes = queued;
+            queued = null;
+            changes.forEach(onChange);
+        }
+    });
+    source.addEventListener('change', (event) => {
+        const change = JSON.parse(event.data);
+        if (queued) {
+            queued.push(change);
+        } else {
+            onChange(change);
+        }
+    });
+    return source;
+}
+
+// Apply one change to a list of books in ISBN order; returns the list
+function applyBookChange(books, change) {
+    if (change.type === 'add_book') {
+        if (!books.some(book => book.isbn === change.isbn)) {
+            const { seq, type, ...book } = change;
+            const at = books.findIndex(other => other.isbn > book.isbn);
+            books.splice(at === -1 ? books.length : at, 0, book);
+        }
+    } else if (change.type === 'remove_book') {
+        return books.filter(book => book.isbn !== change.isbn);
+    } else if (change.type === 'borrow' || change.type === 'return') {
+        const book = books.find(book => book.isbn === change.isbn);
+        if (book) {
+            book.available_copies = change.available_copies;
+        }
+    }
+    return books;
+}
+
 // =========================
 // Initialize
 // =========================
@@ -0,0 +1,592 @@
+# =========================
+# Storage Backends
+# LibrarySystem keeps the AVL tree and indexes in memory; a backend is
+# where that state is made durable (SQLiteStorage with cache=False can
+# also answer the lookups itself, see sqlindex.py). Every change is reported to the
+# backend before it is applied in memory, so a backend that refuses
+# (raises) leaves the in-memory state untouched.
+# =========================
+
+from avl import BookRecord
+from contextlib import contextmanager
+from journal import TransactionJournal
+from snapshot import SnapshotError
+from sqlindex import (SQLBooks, SQLMembers, SQLNameIndex, SQLTextIndex, SQLCategoryIndex,
+                      SQLYearIndex)
+from urllib.request import pathname2url
+import os
+import sqlite3
+import threading
+import time
+
+
+class StorageError(Exception):
+    pass
+
+
+class StorageBackend:
+    # True when lookups are answered by the backend (SQLiteStorage with
+    # cache=False) rather than by in-memory indexes
+    serves_reads = False
+
+    def bind(self, lib):
+        self.lib = lib
+
+    def load_into(self, lib):
+        """Fill an empty LibrarySystem; returns load statistics."""
+        raise NotImplementedError
+
+    @contextmanager
+    def batch(self):
+        """
+        Group the changes reported inside (one batch of transactions).
+        If the block raises, changes reported inside are discarded.
+        """
+        yield
+
+    # Change notifications (called under lib.lock)
+    def add_book(self, isbn, data):
+        pass
+
+    def add_books(self, items):
+        """(isbn, data) pairs from a bulk import."""
+        for isbn, data in items:
+            self.add_book(isbn, data)
+
+    def remove_book(self, isbn):
+        pass
+
+    def add_member(self, member_id, name):
+        pass
+
+    def borrow(self, member_id, isbn):
+        pass
+
+    def return_book(self, member_id, isbn):
+        pass
+
+    def commit(self):
+        """Make reported changes durable (under lib.lock)."""
+        pass
+
+    def sync(self):
+        """The slow part of commit(), such as an fsync, run after lib.lock is released."""
+        pass
+
+    def compact(self):
+        pass
+
+    def close(self):
+        pass
+
+
+# ---------------------
+# CSV files (+ optional journal and binary snapshot)
+# ---------------------
+class CsvStorage(StorageBackend):
+    """
+    The original persistence: books.csv and members.csv. Without a journal
+    every commit rewrites both files; with one, changes are appended to the
+    journal and folded back into the CSVs (and the binary snapshot) on
+    compaction, which runs on a background thread once the journal is long
+    enough.
+    """
+    def __init__(self, books_path="books.csv", members_path="members.csv",
+                 journal_path=None, snapshot_path=None):
+        self.books_path = books_path
+        self.members_path = members_path
+        self.journal = TransactionJournal(journal_path) if journal_path else None
+        self.snapshot_path = snapshot_path
+        # fsyncs records a commit() left pending, should no commit follow
+        self.sync_timer = None
+        # Background fold started by commit(), if one is running
+        self.compactor = None
+
+    def load_into(self, lib):
+        self._finish_compaction()
+        stats = None
+        if self.snapshot_path and self._snapshot_is_current():
+            try:
+                stats = lib.load_snapshot(self.snapshot_path)
+            except SnapshotError as e:
+                print(f"Ignoring snapshot: {e}")
+        from_csv = stats is None
+        if from_csv:
+            stats = lib.load_books_from_csv(self.books_path)
+            lib.load_members_from_csv(self.members_path)
+            stats['source'] = 'csv'
+        self._replay(lib)
+        if from_csv and self.snapshot_path:
+            # Next start can use the snapshot
+            self.compact()
+        return stats
+
+    def _snapshot_is_current(self):
+        try:
+            snap = os.stat(self.snapshot_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        for path in (self.books_path, self.members_path):
+            try:
+                if os.stat(path).st_mtime_ns > snap:
+                    return False
+            except FileNotFoundError:
+                pass
+        return True
+
+    def _replay(self, lib):
+        if not self.journal:
+            return
+        for event in self.journal.replay():
+            op = event.get('op')
+            if op == 'add_book':
+                lib.add_book(event['isbn'], event['title'], event['author'],
+                             event['year'], event['category'], event['copies'],
+                             save=False)
+            elif op == 'remove_book':
+                lib.remove_book(event['isbn'], save=False)
+            elif op == 'add_member':
+                lib.members.add_member(event['member_id'], event['name'])
+            elif op in ('borrow', 'return'):
+                node = lib.books.search(event['isbn'])
+                if node is None:
+                    continue
+                if op == 'borrow':
+                    if lib.members.add_loan(event['member_id'], event['isbn']):
+                        lib.adjust_copies(node, -1)
+                elif lib.members.remove_loan(event['member_id'], event['isbn']):
+                    lib.adjust_copies(node, 1)
+        lib.version += 1
+
+    @contextmanager
+    def batch(self):
+        # Without a journal nothing is written before commit()
+        if not self.journal:
+            yield
+            return
+        mark = self.journal.mark()
+        try:
+            yield
+        except BaseException:
+            self.journal.rollback(mark)
+            raise
+
+    def add_book(self, isbn, data):
+        if self.journal:
+            self.journal.append('add_book', isbn=isbn, title=data['title'],
+                                author=data['author'], year=data['year'],
+                                category=data['category'], copies=data['available_copies'])
+
+    def add_books(self, items):
+        if self.journal:
+            self.journal.append_many('add_book', (
+                {'isbn': isbn, 'title': data['title'], 'author': data['author'],
+                 'year': data['year'], 'category': data['category'],
+                 'copies': data['available_copies']} for isbn, data in items))
+
+    def remove_book(self, isbn):
+        if self.journal:
+            self.journal.append('remove_book', isbn=isbn)
+
+    def add_member(self, member_id, name):
+        if self.journal:
+            self.journal.append('add_member', member_id=member_id, name=name)
+
+    def borrow(self, member_id, isbn):
+        if self.journal:
+            self.journal.append('borrow', member_id=member_id, isbn=isbn)
+
+    def return_book(self, member_id, isbn):
+        if self.journal:
+            self.journal.append('return', member_id=member_id, isbn=isbn)
+
+    def commit(self):
+        if not self.journal:
+            self.lib.save_books(self.books_path)
+            self.lib.save_members(self.members_path)
+            return
+        if self.journal.needs_compaction():
+            if self.compactor is None or not self.compactor.is_alive():
+                # The rotation and capture are quick; the writing is not
+                self.compactor = threading.Thread(target=self._fold_in_background,
+                                                  args=(self._begin_compaction(),),
+                                                  name="library-compaction", daemon=True)
+                self.compactor.start()
+        elif self.journal.pending and not self.journal.due() and self.sync_timer is None:
+            self.sync_timer = threading.Timer(self.journal.sync_interval, self._sync_pending)
+            self.sync_timer.daemon = True
+            self.sync_timer.start()
+
+    def sync(self):
+        if self.journal:
+            self.journal.commit()
+
+    def _sync_pending(self):
+        with self.lib.lock:
+            self.sync_timer = None
+        self.journal.commit(force=True)
+
+    def compact(self):
+        """
+        Fold the journal into fresh CSV (and binary) snapshots. The
+        journal is rotated aside first and dropped only after the new
+        CSVs are in place, so a crash at any point neither loses events
+        nor replays them twice (see _finish_compaction).
+        """
+        if not self.journal:
+            self.lib.save_books(self.books_path)
+            self.lib.save_members(self.members_path)
+            if self.snapshot_path:
+                self.lib.save_snapshot(self.snapshot_path)
+            return
+        self._wait_for_compactor()
+        self._fold(self._begin_compaction())
+
+    def _begin_compaction(self):
+        """
+        Rotate the journal and capture the state it leads to, in one hold
+        of the writer lock: the rotated events are exactly what the
+        capture covers.
+        """
+        with self.lib.lock:
+            self.journal.rotate()
+            return self.lib.capture()
+
+    def _fold(self, captured):
+        """Write the captured state out; needs no lock."""
+        books, members = captured
+        self.lib.save_books(self.books_path + ".new", books)
+        self.lib.save_members(self.members_path + ".new", members)
+        self.journal.folded()
+        self._install_new_csvs()
+        if self.snapshot_path:
+            self.lib.save_snapshot(self.snapshot_path, captured)
+        self.journal.discard_folded()
+
+    def _fold_in_background(self, captured):
+        try:
+            self._fold(captured)
+        except Exception as e:
+            # The rotated journal stays put and is merged back on the
+            # next rotation or restart, so nothing is lost
+            print(f"Compaction failed: {e}")
+
+    def _wait_for_compactor(self):
+        if self.compactor is not None:
+            self.compactor.join()
+            self.compactor = None
+
+    def _install_new_csvs(self):
+        for path in (self.books_path, self.members_path):
+            if os.path.exists(path + ".new"):
+                os.replace(path + ".new", path)
+
+    def _finish_compaction(self):
+        """
+        Recover from a compaction cut short. Before the journal was marked
+        folded, the .new CSVs may be partial: drop them (the journal has
+        already put the rotated events back). After it, they are complete:
+        install them.
+        """
+        if not self.journal:
+            return
+        if os.path.exists(self.journal.folded_path):
+            self._install_new_csvs()
+            self.journal.discard_folded()
+            return
+        for path in (self.books_path, self.members_path):
+            if os.path.exists(path + ".new"):
+                os.remove(path + ".new")
+
+    def close(self):
+        if self.sync_timer is not None:
+            self.sync_timer.cancel()
+            self.sync_timer = None
+        self._wait_for_compactor()
+        if self.journal:
+            self.journal.close()
+
+
+# ---------------------
+# SQLite
+# ---------------------
+class SQLiteStorage(StorageBackend):
+    """
+    One row per book, member and loan. Every change is its own transaction
+    (WAL mode), so writes are row-sized and crash-safe; borrow/return
+    update the copy count and the loan row atomically. A batch of changes
+    is one transaction. A brand-new database is seeded from the CSV files
+    on first load (once: emptying it later does not bring them back).
+
+    By default the whole catalog is loaded into memory as with CSV. With
+    cache=False nothing is loaded: LibrarySystem's tree and indexes are
+    replaced by sqlindex.py classes that query this database, so memory
+    stays flat however large the catalog grows. Lookups then run on
+    per-thread read-only connections and never wait for a write. Fuzzy
+    search finds nothing in that mode (there is no trigram index).
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS books (
+            isbn TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            title_norm TEXT NOT NULL,
+            author TEXT NOT NULL,
+            author_norm TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            available_copies INTEGER NOT NULL CHECK (available_copies >= 0)
+        );
+        CREATE INDEX IF NOT EXISTS books_title ON books (title_norm);
+        CREATE INDEX IF NOT EXISTS books_author ON books (author_norm);
+        CREATE TABLE IF NOT EXISTS members (
+            member_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS loans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id TEXT NOT NULL REFERENCES members (member_id),
+            isbn TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS loans_member ON loans (member_id);
+        CREATE INDEX IF NOT EXISTS loans_isbn ON loans (isbn);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+    # Added for cache=False: year/category browsing and keyword search.
+    # The triggers keep the external-content FTS table in step with books.
+    READ_SCHEMA = """
+        CREATE INDEX IF NOT EXISTS books_year ON books (year, isbn);
+        CREATE INDEX IF NOT EXISTS books_category ON books (category COLLATE NOCASE, year, isbn);
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_text USING fts5 (
+            title, author, category, content='books',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS books_text_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_text (rowid, title, author, category)
+            VALUES (new.rowid, new.title, new.author, new.category);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_text_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_text (books_text, rowid, title, author, category)
+            VALUES ('delete', old.rowid, old.title, old.author, old.category);
+        END;
+    """
+
+    def __init__(self, path="library.db", import_books="books.csv",
+                 import_members="members.csv", cache=True):
+        self.path = path
+        self.import_books = import_books
+        self.import_members = import_members
+        self.cache = cache
+        self.serves_reads = not cache
+        self.readers = threading.local()  # per-thread read-only connections
+        self.writer = None                # thread inside a transaction
+        # Calls arrive from Flask worker threads, serialized by lib.lock
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+        if not cache:
+            # First time without the cache: index the existing rows too
+            fresh = not self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'books_text'").fetchone()
+            self.conn.executescript(
+                "BEGIN IMMEDIATE;" + self.READ_SCHEMA +
+                ("INSERT INTO books_text (books_text) VALUES ('rebuild');" if fresh else "") +
+                "COMMIT;")
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.lower().split())
+
+    @contextmanager
+    def _transaction(self):
+        cur = self.conn.cursor()
+        # Inside batch() each change is a savepoint, so a refused change
+        # rolls back alone and the batch commits once
+        if self.conn.in_transaction:
+            cur.execute("SAVEPOINT change")
+            try:
+                yield cur
+            except BaseException:
+                cur.execute("ROLLBACK TO change")
+                cur.execute("RELEASE change")
+                raise
+            cur.execute("RELEASE change")
+            return
+        cur.execute("BEGIN IMMEDIATE")
+        self.writer = threading.get_ident()
+        try:
+            yield cur
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        else:
+            cur.execute("COMMIT")
+        finally:
+            self.writer = None
+
+    def reader(self):
+        """
+        Connection for a cache=False lookup: the writer's own while it is
+        inside a transaction (so a batch sees its earlier changes),
+        otherwise this thread's read-only one, which in WAL mode reads the
+        last commit without waiting for the writer.
+        """
+        if self.writer == threading.get_ident() or self.path == ":memory:":
+            return self.conn
+        conn = getattr(self.readers, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect("file:%s?mode=ro" % pathname2url(os.path.abspath(self.path)),
+                                   uri=True, isolation_level=None, check_same_thread=False)
+            self.readers.conn = conn
+        return conn
+
+    @contextmanager
+    def batch(self):
+        with self._transaction():
+            yield
+
+    def _book_row(self, isbn, data):
+        return (isbn, data['title'], self.normalize(data['title']),
+                data['author'], self.normalize(data['author']),
+                data['year'], data['category'], data['available_copies'])
+
+    # ---------------------
+    # Load
+    # ---------------------
+    def load_into(self, lib):
+        # Seed the database first, then load memory from it as usual, so
+        # a failed seed leaves memory empty rather than out of step
+        seeded = self._needs_seed() and self._seed(lib)
+
+        start = time.perf_counter()
+        if not self.cache:
+            lib.books = SQLBooks(self)
+            lib.members = SQLMembers(self)
+            lib.title_index = SQLNameIndex(self, 'title_norm')
+            lib.author_index = SQLNameIndex(self, 'author_norm')
+            lib.text_index = SQLTextIndex(self)
+            lib.category_index = SQLCategoryIndex(self)
+            lib.year_index = SQLYearIndex(self)
+            lib.version += 1
+            books = lib.books.size
+            return {
+                'rows': books,
+                'books': books,
+                'source': 'csv' if seeded else 'sqlite',
+                'seconds': time.perf_counter() - start,
+            }
+        items = [(isbn, BookRecord(title, author, year, category, copies))
+                 for isbn, title, author, year, category, copies in self.conn.execute(
+                     "SELECT isbn, title, author, year, category, available_copies "
+                     "FROM books ORDER BY isbn")]
+        lib._build_catalog(items)
+        for member_id, name in self.conn.execute(
+                "SELECT member_id, name FROM members ORDER BY member_id"):
+            lib.members.add_member(member_id, name)
+        for member_id, isbn in self.conn.execute(
+                "SELECT member_id, isbn FROM loans ORDER BY id"):
+            lib.members.add_loan(member_id, isbn)
+        lib.version += 1
+        return {
+            'rows': len(items),
+            'books': lib.books.size,
+            'source': 'csv' if seeded else 'sqlite',
+            'seconds': time.perf_counter() - start,
+        }
+
+    def _needs_seed(self):
+        """True only for a database that has never held any data."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone():
+            return False
+        if any(self.conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table})").fetchone()[0]
+               for table in ('books', 'members', 'loans')):
+            # Created before the flag existed
+            self.conn.execute("INSERT INTO meta VALUES ('seeded', '1')")
+            return False
+        return True
+
+    def _seed(self, lib):
+        """Copy the CSV files into the new database; True if there were any."""
+        if not (self.import_books and os.path.exists(self.import_books)):
+            return False
+        # Parsed by a scratch library with no storage of its own
+        scratch = type(lib)(StorageBackend())
+        scratch.load_books_from_csv(self.import_books)
+        if self.import_members:
+            scratch.load_members_from_csv(self.import_members)
+        self._import(scratch)
+        return True
+
+    def _import(self, lib):
+        with self._transaction() as cur:
+            cur.execute("INSERT INTO meta VALUES ('seeded', '1')")
+            cur.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (self._book_row(isbn, data) for isbn, data in lib.books.iter_inorder()))
+            members = lib.members.page(0, len(lib.members))
+            cur.executemany("INSERT INTO members VALUES (?, ?)",
+                            ((member_id, m.name) for member_id, m in members))
+            cur.executemany("INSERT INTO loans (member_id, isbn) VALUES (?, ?)",
+                            ((member_id, isbn) for member_id, m in members
+                             for isbn in m.borrowed_books))
+
+    # ---------------------
+    # Changes
+    # ---------------------
+    def add_book(self, isbn, data):
+        with self._transaction() as cur:
+            cur.execute("INSERT INTO books VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        self._book_row(isbn, data))
+
+    def add_books(self, items):
+        with self._transaction() as cur:
+            cur.executemany("INSERT INTO books VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (self._book_row(isbn, data) for isbn, data in items))
+
+    def remove_book(self, isbn):
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM books WHERE isbn = ?", (isbn,))
+
+    def add_member(self, member_id, name):
+        with self._transaction() as cur:
+            cur.execute("INSERT INTO members VALUES (?, ?)", (member_id, name))
+
+    def borrow(self, member_id, isbn):
+        with self._transaction() as cur:
+            cur.execute("UPDATE books SET available_copies = available_copies - 1 "
+                        "WHERE isbn = ? AND available_copies > 0", (isbn,))
+            if cur.rowcount != 1:
+                raise StorageError(f"no copy of {isbn} available in storage")
+            cur.execute("INSERT INTO loans (member_id, isbn) VALUES (?, ?)", (member_id, isbn))
+
+    def return_book(self, member_id, isbn):
+        with self._transaction() as cur:
+            cur.execute("DELETE FROM loans WHERE id = (SELECT id FROM loans "
+                        "WHERE member_id = ? AND isbn = ? ORDER BY id LIMIT 1)",
+                        (member_id, isbn))
+            if cur.rowcount != 1:
+                raise StorageError(f"{member_id} holds no loan of {isbn} in storage")
+            cur.execute("UPDATE books SET available_copies = available_copies + 1 "
+                        "WHERE isbn = ?", (isbn,))
+
+    def compact(self):
+        with self.lib.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        self.conn.close()
+
+
+def default_storage():
+    """
+    SQLite when LIBRARY_DB is set (LIBRARY_DB_CACHE=0 to query it instead
+    of loading it), otherwise CSV files with a journal.
+    """
+    db_path = os.environ.get("LIBRARY_DB")
+    if db_path:
+        return SQLiteStorage(db_path, cache=os.environ.get("LIBRARY_DB_CACHE", "1") != "0")
+    return CsvStorage("books.csv", "members.csv",
+                      journal_path="library.journal", snapshot_path="library.snap")
@@ -0,0 +1,223 @@
+# =========================
+# Concurrency stress test for LibrarySystem
+#
+#   python stress.py [--threads 16] [--seconds 5] [--copies 50]
+#
+# 1. Contention: many threads borrow and return copies of one book while
+#    a checker keeps asserting available copies + copies on loan ==
+#    total, and that no member goes over the borrow limit.
+# 2. Readers vs writers: a writer adds and removes books while readers
+#    run title, author, keyword, autocomplete, fuzzy and faceted
+#    lookups, which must not raise or return mismatched entries.
+# 3. Member table growth: a writer adds members (resizing the member
+#    hash table) while readers look up existing members, page through
+#    the list and ask who holds the contended book; none may go missing.
+# Runs on a temporary data directory; exits 1 on any violation.
+# =========================
+
+from library_system import LibrarySystem, write_csv, BOOK_COLUMNS, MEMBER_COLUMNS
+from storage import CsvStorage
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+MAX_LOANS = 5
+ISBN = "9990000000001"
+
+
+def open_library(data_dir):
+    storage = CsvStorage(os.path.join(data_dir, "books.csv"),
+                         os.path.join(data_dir, "members.csv"),
+                         journal_path=os.path.join(data_dir, "library.journal"),
+                         snapshot_path=os.path.join(data_dir, "library.snap"))
+    lib = LibrarySystem(storage)
+    lib.load()
+    return lib
+
+
+def on_loan(lib, isbn):
+    return sum(copies for _, copies in lib.members.holders(isbn))
+
+
+def run_threads(workers, seconds):
+    """Run callables(stop) on threads for a while; returns their errors."""
+    stop = threading.Event()
+    errors = []
+
+    def guarded(work):
+        try:
+            work(stop)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            stop.set()
+
+    threads = [threading.Thread(target=guarded, args=(work,)) for work in workers]
+    for thread in threads:
+        thread.start()
+    stop.wait(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+# ---------------------
+# 1. Borrow/return contention
+# ---------------------
+def contention(lib, threads, seconds, copies):
+    members = [f"S-{i:04d}" for i in range(threads * 4)]
+    for member_id in members:
+        lib.add_member(member_id, member_id)
+    lib.add_book(ISBN, "Contended Copy", "Stress Author", 2000, "Stress", copies)
+    counts = {'borrow': 0, 'return': 0, 'refused': 0}
+    counts_lock = threading.Lock()
+
+    def circulate(stop):
+        rng = random.Random()
+        while not stop.is_set():
+            member_id = rng.choice(members)
+            if lib.borrow_book(member_id, ISBN):
+                kind = 'borrow'
+                lib.persist()
+            elif lib.return_book(member_id, ISBN):
+                kind = 'return'
+                lib.persist()
+            else:
+                kind = 'refused'
+            with counts_lock:
+                counts[kind] += 1
+
+    def check(stop):
+        while not stop.is_set():
+            with lib.lock:
+                available = lib.search_by_isbn(ISBN)['available_copies']
+                loaned = on_loan(lib, ISBN)
+                if available < 0 or available + loaned != copies:
+                    raise AssertionError(f"{available} available + {loaned} on loan != {copies}")
+                for member_id in members:
+                    if len(lib.members.get_member(member_id).borrowed_books) > MAX_LOANS:
+                        raise AssertionError(f"{member_id} is over the borrow limit")
+            time.sleep(0.001)
+
+    errors = run_threads([circulate] * threads + [check], seconds)
+    available = lib.search_by_isbn(ISBN)['available_copies']
+    print(f"contention: {counts['borrow']} borrows, {counts['return']} returns, "
+          f"{counts['refused']} refused; {available} available + "
+          f"{on_loan(lib, ISBN)} on loan of {copies}")
+    return errors
+
+
+# ---------------------
+# 2. Index readers vs writers
+# ---------------------
+def readers_vs_writers(lib, threads, seconds):
+    titles = ["Dune", "Dune Messiah", "Dune Chronicles", "Foundation", "Found Objects"]
+    normalize = lib.title_index.normalize
+
+    def write(stop):
+        rng = random.Random(1)
+        added = []
+        n = 0
+        while not stop.is_set():
+            if added and (len(added) > 200 or rng.random() < 0.4):
+                lib.remove_book(added.pop(rng.randrange(len(added))))
+            else:
+                n += 1
+                isbn = f"8880{n:09d}"
+                if lib.add_book(isbn, f"{rng.choice(titles)} {n}", f"Writer {n % 7}",
+                                1990 + n % 30, rng.choice(["Sci-Fi", "Essays"]), 1 + n % 3):
+                    added.append(isbn)
+
+    def read(stop):
+        rng = random.Random()
+        while not stop.is_set():
+            prefix = rng.choice(["dune", "found", "dune m"])
+            for isbn, data in lib.autocomplete_titles(prefix, 20):
+                if not normalize(data['title']).startswith(prefix):
+                    raise AssertionError(f"autocomplete {prefix!r} returned {isbn} {data['title']!r}")
+            author = f"Writer {rng.randrange(7)}"
+            for isbn, data in lib.find_by_author(author):
+                if data['author'] != author:
+                    raise AssertionError(f"find_by_author {author!r} returned {isbn} {data['author']!r}")
+            title = f"{rng.choice(titles)} {rng.randrange(1, 500)}"
+            for isbn, data in lib.find_by_title(title):
+                if normalize(data['title']) != normalize(title):
+                    raise AssertionError(f"find_by_title {title!r} returned {isbn} {data['title']!r}")
+            lib.search_text(rng.choice(["dune", "writer", "sci fi essays"]), 20)
+            lib.search_fuzzy(rng.choice(["dnue", "foundaton", "writr 3"]), 10)
+            for _, data in lib.filter_books("Sci-Fi", 1995, 2005, available_only=True):
+                if data['available_copies'] <= 0:
+                    raise AssertionError("filter_books returned an unavailable book")
+
+    errors = run_threads([write] + [read] * max(threads // 2, 1), seconds)
+    print(f"readers vs writers: {lib.books.size} books at the end")
+    return errors
+
+
+# ---------------------
+# 3. Member reads during table growth
+# ---------------------
+def member_growth(lib, threads, seconds):
+    known = [member_id for member_id, _ in lib.list_members_page(0, len(lib.members))]
+
+    def write(stop):
+        n = 0
+        while not stop.is_set():
+            n += 1
+            lib.add_member(f"Z-{n:07d}", f"Grown {n}")  # sorts after the known IDs
+
+    def read(stop):
+        rng = random.Random()
+        while not stop.is_set():
+            member_id = rng.choice(known)
+            if lib.members.get_member(member_id) is None or lib.get_member(member_id) is None:
+                raise AssertionError(f"existing member {member_id} not found")
+            page = [member_id for member_id, _ in lib.list_members_page(0, len(known))]
+            if page != sorted(known):
+                raise AssertionError("first page of members changed")
+            for member_id, member, copies in lib.book_holders(ISBN):
+                if member is None or copies < 1:
+                    raise AssertionError(f"bad holder {member_id}: {copies}")
+
+    errors = run_threads([write] + [read] * max(threads // 2, 1), seconds)
+    print(f"member growth: {len(lib.members)} members at the end")
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrency stress test for LibrarySystem")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=5.0, help="per phase")
+    parser.add_argument('--copies', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="library-stress-") as data_dir:
+        write_csv(os.path.join(data_dir, "books.csv"), BOOK_COLUMNS, [])
+        write_csv(os.path.join(data_dir, "members.csv"), MEMBER_COLUMNS, [])
+        lib = open_library(data_dir)
+        errors = contention(lib, args.threads, args.seconds, args.copies)
+        errors += readers_vs_writers(lib, args.threads, args.seconds)
+        errors += member_growth(lib, args.threads, args.seconds)
+        expected = lib.search_by_isbn(ISBN)['available_copies']
+        lib.close()
+
+        # What was persisted must agree with memory
+        lib = open_library(data_dir)
+        reloaded = lib.search_by_isbn(ISBN)['available_copies']
+        if reloaded + on_loan(lib, ISBN) != args.copies or reloaded != expected:
+            errors.append(f"after reload: {reloaded} available (expected {expected}), "
+                          f"{on_loan(lib, ISBN)} on loan")
+        lib.close()
+
+    for error in errors:
+        print(f"FAIL {error}")
+    print("FAILED" if errors else "OK")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())